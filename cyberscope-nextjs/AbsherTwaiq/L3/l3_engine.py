@@ -1,23 +1,33 @@
 import os
 import joblib
 import numpy as np
+from functools import lru_cache
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+
+
 # ================================
 # Load all models from /models
+# (once per process, on first use)
 # ================================
+class L3Models:
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_DIR = os.path.join(BASE_DIR, "models")
+    def __init__(self, model_dir: str = MODEL_DIR):
+        self.risk_model = joblib.load(os.path.join(model_dir, "risk_model.pkl"))
+        self.mitre_model = joblib.load(os.path.join(model_dir, "mitre_model.pkl"))
+        self.escalation_model = joblib.load(os.path.join(model_dir, "escalation_model.pkl"))
+        self.cluster_model = joblib.load(os.path.join(model_dir, "cluster_model.pkl"))
 
-risk_model = joblib.load(os.path.join(MODEL_DIR, "risk_model.pkl"))
-mitre_model = joblib.load(os.path.join(MODEL_DIR, "mitre_model.pkl"))
-escalation_model = joblib.load(os.path.join(MODEL_DIR, "escalation_model.pkl"))
-cluster_model = joblib.load(os.path.join(MODEL_DIR, "cluster_model.pkl"))
+        self.vectorizer = joblib.load(os.path.join(model_dir, "vectorizer.pkl"))
+        self.label_encoder = joblib.load(os.path.join(model_dir, "label_encoder.pkl"))
 
-vectorizer = joblib.load(os.path.join(MODEL_DIR, "vectorizer.pkl"))
-label_encoder = joblib.load(os.path.join(MODEL_DIR, "label_encoder.pkl"))
+
+@lru_cache(maxsize=1)
+def get_models() -> L3Models:
+    return L3Models()
 
 
 # ================================
@@ -34,34 +44,37 @@ def build_text_feature(alert: dict, llm_response: dict):
 # ================================
 # Main Prediction Function
 # ================================
-def predict_l3(alert: dict, llm_response: dict):
+def predict_l3(alert: dict, llm_response: dict, models: L3Models = None):
     """
     Inputs:
         alert = original alert (description, username, ip, location)
         llm_response = the 6-field SOAx LLM output
+        models = loaded L3Models (default: process-wide, see get_models)
     
     Returns:
         dict = predictions for L3 dashboard
     """
 
+    m = models or get_models()
+
     # Step 1 — Build combined text
     text = build_text_feature(alert, llm_response)
 
     # Step 2 — Vectorize
-    X = vectorizer.transform([text])
+    X = m.vectorizer.transform([text])
 
     # Step 3 — Predict Risk
-    predicted_risk = int(risk_model.predict(X)[0])
+    predicted_risk = int(m.risk_model.predict(X)[0])
 
     # Step 4 — Predict MITRE
-    mitre_encoded = mitre_model.predict(X)[0]
-    predicted_mitre = label_encoder.inverse_transform([mitre_encoded])[0]
+    mitre_encoded = m.mitre_model.predict(X)[0]
+    predicted_mitre = m.label_encoder.inverse_transform([mitre_encoded])[0]
 
     # Step 5 — Predict Escalation
-    escalation_level = int(escalation_model.predict(X)[0])
+    escalation_level = int(m.escalation_model.predict(X)[0])
 
     # Step 6 — Predict Cluster
-    cluster_id = int(cluster_model.predict(X)[0])
+    cluster_id = int(m.cluster_model.predict(X)[0])
 
     # Step 7 — Build Insight (simple auto message)
     insight = "This alert resembles cluster pattern #{}, which often matches similar historical attack behaviors.".format(cluster_id)
@@ -1,33 +1,364 @@
 # ============================================================
-# LLM.py — Using HuggingFace InferenceClient with provider
+# LLM.py — Text generation through a pluggable backend
+#   (llm_backends.py: remote HF inference or local transformers)
+# - Persistent prompt → response cache (SQLite, size-bounded)
+# - Async layer: acall_llm / call_llm_many (bounded concurrency)
+# - Streaming: stream_llm / astream_llm stop once all 6 fields parse
 # ============================================================
 
 import os
-from huggingface_hub import InferenceClient
-from dotenv import load_dotenv
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
 
-load_dotenv()
+from prompt_generator import StreamingParser
+from llm_backends import MODEL, LLM_TIMEOUT, get_backend
 
-API_KEY = os.getenv("HF_API_KEY")
+GENERATION_PARAMS = {"max_new_tokens": 300, "temperature": 0.1}
 
-# Initialize client exactly the way your model requires
-client = InferenceClient(
-    model="fdtn-ai/Foundation-Sec-8B",
-    provider="featherless-ai",
-    api_key=API_KEY
-)
+# Generations kept in flight by call_llm_many
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+# Stream tokens and cancel generation once the 6 fields are parsed
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
 
-def call_llm(prompt: str) -> str:
-    if not API_KEY:
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_DIR, "storage", "llm_cache.sqlite3"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def cache_model() -> str:
+    return get_backend().name
+
+
+# ============================================================
+# Content-addressed response cache
+# ============================================================
+def cache_key(prompt: str, model: str = MODEL, params: dict = None) -> str:
+    """Hash of prompt + model + generation parameters."""
+    payload = json.dumps(
+        {"prompt": prompt, "model": model, "params": params or GENERATION_PARAMS},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite table of key → response. Once the stored responses exceed
+    max_bytes, the least recently used rows are evicted.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key       TEXT PRIMARY KEY,
+                model     TEXT NOT NULL,
+                response  TEXT NOT NULL,
+                size      INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_last_used ON llm_responses(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = MODEL):
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently used rows until back under the limit
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_response_cache():
+    return LLMResponseCache() if LLM_CACHE_ENABLED else None
+
+
+def generation_params(max_new_tokens: int = None) -> dict:
+    if max_new_tokens is None:
+        return GENERATION_PARAMS
+    return {**GENERATION_PARAMS, "max_new_tokens": max_new_tokens}
+
+
+def missing_credentials() -> bool:
+    return get_backend().missing_credentials()
+
+
+def call_llm(prompt: str, max_new_tokens: int = None) -> str:
+    if missing_credentials():
         return "[ERROR] Missing HF_API_KEY in environment variables."
 
+    params = generation_params(max_new_tokens)
+    cache = get_response_cache()
+    key = cache_key(prompt, cache_model(), params)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
     try:
-        response = client.text_generation(
-            prompt,
-            max_new_tokens=300,
-            temperature=0.1
+        response = get_backend().generate(prompt, params)
+
+    except Exception as e:
+        return f"[EXCEPTION] LLM request failed: {str(e)}"
+
+    # Failures are never cached
+    if cache:
+        cache.put(key, response, cache_model())
+    return response
+
+
+# ============================================================
+# Async layer
+# ============================================================
+async def acall_llm(prompt: str, timeout: float = LLM_TIMEOUT,
+                    session=None, max_new_tokens: int = None) -> str:
+    """
+    Async call_llm: same cache, same error strings, per-request timeout.
+    Cache reads and writes (SQLite, a commit each) run off the loop.
+    """
+    if missing_credentials():
+        return "[ERROR] Missing HF_API_KEY in environment variables."
+
+    params = generation_params(max_new_tokens)
+    cache = get_response_cache()
+    key = cache_key(prompt, cache_model(), params)
+    if cache:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached
+
+    own_session = session is None
+    if own_session:
+        session = get_backend().async_session()
+
+    try:
+        response = await asyncio.wait_for(
+            session.agenerate(prompt, params),
+            timeout
         )
-        return response
+
+    except asyncio.TimeoutError:
+        return f"[EXCEPTION] LLM request timed out after {timeout:g}s"
 
     except Exception as e:
         return f"[EXCEPTION] LLM request failed: {str(e)}"
+
+    finally:
+        if own_session:
+            await session.aclose()
+
+    if cache:
+        await asyncio.to_thread(cache.put, key, response, cache_model())
+    return response
+
+
+async def call_llm_many(prompts: list[str], concurrency: int = LLM_CONCURRENCY,
+                        timeout: float = LLM_TIMEOUT, max_new_tokens: int = None) -> list[str]:
+    """
+    Runs many prompts with at most `concurrency` generations in flight
+    over one shared backend session. Results keep the input order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with get_backend().async_session() as session:
+
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await acall_llm(prompt, timeout=timeout, session=session,
+                                       max_new_tokens=max_new_tokens)
+
+        return await asyncio.gather(*(run(p) for p in prompts))
+
+
+# ============================================================
+# Streaming layer (early stop)
+# ============================================================
+def stream_metrics(parser: StreamingParser, chunks: int, stopped_early: bool,
+                   cached: bool = False) -> dict:
+    return {
+        "time_to_first_field_s": parser.first_field_s,
+        "time_to_complete_s": parser.complete_s,
+        "chunks": chunks,
+        "stopped_early": stopped_early,
+        "cached": cached
+    }
+
+
+def replay_cached(text: str, on_field=None) -> tuple[str, dict]:
+    """Cache hit: run the text through the parser so on_field still fires."""
+    parser = StreamingParser(on_field)
+    parser.feed(text)
+    parser.finish()
+    return text, stream_metrics(parser, 0, False, cached=True)
+
+
+def stream_llm(prompt: str, on_field=None, max_new_tokens: int = None) -> tuple[str, dict]:
+    """
+    call_llm over a token stream. Tokens feed a StreamingParser and the
+    stream is closed as soon as all six fields are parsed, so the
+    endpoint stops generating instead of running to max_new_tokens.
+
+    Returns (raw text, metrics); metrics carry time_to_first_field_s
+    for partial-triage display. on_field(field, value, elapsed_s)
+    fires as each field lands.
+    """
+    if missing_credentials():
+        return "[ERROR] Missing HF_API_KEY in environment variables.", {}
+
+    params = generation_params(max_new_tokens)
+    cache = get_response_cache()
+    key = cache_key(prompt, cache_model(), params)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return replay_cached(cached, on_field)
+
+    parser = StreamingParser(on_field)
+    chunks = 0
+    stopped_early = False
+
+    try:
+        stream = get_backend().stream(prompt, params)
+        try:
+            for token in stream:
+                chunks += 1
+                parser.feed(token)
+                if parser.complete:
+                    stopped_early = True
+                    break
+        finally:
+            # Cancels the rest of the generation
+            stream.close()
+
+    except Exception as e:
+        return f"[EXCEPTION] LLM request failed: {str(e)}", stream_metrics(parser, chunks, False)
+
+    parser.finish()
+    response = parser.buffer
+    if cache:
+        cache.put(key, response, cache_model())
+    return response, stream_metrics(parser, chunks, stopped_early)
+
+
+async def astream_llm(prompt: str, on_field=None, timeout: float = LLM_TIMEOUT,
+                      session=None, max_new_tokens: int = None) -> tuple[str, dict]:
+    """Async stream_llm: same cache (used off the loop), early stop and metrics."""
+    if missing_credentials():
+        return "[ERROR] Missing HF_API_KEY in environment variables.", {}
+
+    params = generation_params(max_new_tokens)
+    cache = get_response_cache()
+    key = cache_key(prompt, cache_model(), params)
+    if cache:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return replay_cached(cached, on_field)
+
+    own_session = session is None
+    if own_session:
+        session = get_backend().async_session()
+
+    parser = StreamingParser(on_field)
+    state = {"chunks": 0, "stopped_early": False}
+
+    async def consume():
+        stream = await session.astream(prompt, params)
+        try:
+            async for token in stream:
+                state["chunks"] += 1
+                parser.feed(token)
+                if parser.complete:
+                    state["stopped_early"] = True
+                    break
+        finally:
+            await stream.aclose()
+
+    try:
+        await asyncio.wait_for(consume(), timeout)
+
+    except asyncio.TimeoutError:
+        return (f"[EXCEPTION] LLM request timed out after {timeout:g}s",
+                stream_metrics(parser, state["chunks"], False))
+
+    except Exception as e:
+        return (f"[EXCEPTION] LLM request failed: {str(e)}",
+                stream_metrics(parser, state["chunks"], False))
+
+    finally:
+        if own_session:
+            await session.aclose()
+
+    parser.finish()
+    response = parser.buffer
+    if cache:
+        await asyncio.to_thread(cache.put, key, response, cache_model())
+    return response, stream_metrics(parser, state["chunks"], state["stopped_early"])
@@ -0,0 +1,152 @@
+# ============================================================
+# RAG/attack_snapshot.py
+# Offline ATT&CK Snapshot for SOAx
+# - Fetches techniques, mitigations and relationships over TAXII once
+# - Stores them as one compact pickle with a version stamp
+# - Loads in milliseconds, no network (air-gapped nodes)
+#
+# The snapshot is a pickle: loading it can run arbitrary code.
+# Only load files you built yourself or copied from a trusted host.
+#
+# Refresh on a connected machine, then copy the file over:
+#   python -m RAG.attack_snapshot --refresh
+#   python -m RAG.attack_snapshot            (print version stamp)
+# ============================================================
+
+import os
+import json
+import pickle
+import argparse
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PATH = os.getenv(
+    "ATTACK_SNAPSHOT_PATH",
+    os.path.join(BASE_DIR, "data", "attack_snapshot.pkl")
+)
+
+# Bump when the stored layout changes
+SNAPSHOT_FORMAT = 1
+
+TECHNIQUE_FIELDS = (
+    "id", "name", "description", "kill_chain_phases",
+    "external_references", "x_mitre_is_subtechnique", "modified"
+)
+MITIGATION_FIELDS = ("id", "name", "description")
+RELATIONSHIP_FIELDS = ("relationship_type", "source_ref", "target_ref")
+RELATIONSHIP_TYPES = ("mitigates", "subtechnique-of")
+
+
+# ------------------------------------------------------------
+# STIX object → plain dict (only the fields SOAx reads)
+# ------------------------------------------------------------
+def to_plain(obj, fields: tuple) -> dict:
+    if hasattr(obj, "serialize"):
+        obj = json.loads(obj.serialize())
+    return {k: obj[k] for k in fields if k in obj}
+
+
+# ------------------------------------------------------------
+# Fetch from TAXII (the only networked step)
+# ------------------------------------------------------------
+def fetch_snapshot() -> dict:
+    from attackcti import attack_client
+
+    lift = attack_client()
+
+    techniques = [to_plain(t, TECHNIQUE_FIELDS) for t in lift.get_techniques()]
+    mitigations = [to_plain(m, MITIGATION_FIELDS) for m in lift.get_mitigations()]
+    relationships = [
+        to_plain(r, RELATIONSHIP_FIELDS)
+        for r in lift.get_relationships()
+        if r.get("relationship_type") in RELATIONSHIP_TYPES
+    ]
+
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "version": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+        "attack_modified": max((t.get("modified", "") for t in techniques), default=""),
+        "techniques": techniques,
+        "mitigations": mitigations,
+        "relationships": relationships,
+    }
+
+
+# ------------------------------------------------------------
+# Disk I/O
+# ------------------------------------------------------------
+def save_snapshot(snapshot: dict, path: str = SNAPSHOT_PATH) -> str:
+    """Writes atomically so readers never see a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> dict:
+    """Unpickles the snapshot: `path` must be a trusted file (see header)."""
+    with open(path, "rb") as f:
+        snapshot = pickle.load(f)
+
+    if snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(
+            f"ATT&CK snapshot at {path} has format {snapshot.get('format')}, "
+            f"expected {SNAPSHOT_FORMAT}. Run: python -m RAG.attack_snapshot --refresh"
+        )
+
+    return snapshot
+
+
+def refresh_snapshot(path: str = SNAPSHOT_PATH) -> dict:
+    snapshot = fetch_snapshot()
+    save_snapshot(snapshot, path)
+    return snapshot
+
+
+def load_or_fetch_snapshot(path: str = SNAPSHOT_PATH) -> dict:
+    """Loads the local snapshot; fetches it only if none exists yet."""
+    if os.path.exists(path):
+        return load_snapshot(path)
+
+    try:
+        return refresh_snapshot(path)
+    except Exception as e:
+        raise RuntimeError(
+            f"No ATT&CK snapshot at {path} and TAXII fetch failed ({e}). "
+            "Run 'python -m RAG.attack_snapshot --refresh' on a connected "
+            "machine and copy the file here."
+        ) from e
+
+
+def describe(snapshot: dict) -> str:
+    return (
+        f"version={snapshot['version']} "
+        f"attack_modified={snapshot['attack_modified']} "
+        f"techniques={len(snapshot['techniques'])} "
+        f"mitigations={len(snapshot['mitigations'])} "
+        f"relationships={len(snapshot['relationships'])}"
+    )
+
+
+# ------------------------------------------------------------
+# Manual Execution
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local ATT&CK snapshot")
+    parser.add_argument("--refresh", action="store_true", help="re-download from TAXII")
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.refresh:
+        snap = refresh_snapshot(args.path)
+        print(f"Saved ATT&CK snapshot → {args.path}")
+        print(describe(snap))
+    else:
+        print(describe(load_snapshot(args.path)))
@@ -1,16 +1,50 @@
 # ============================================================
 # MITRE ATT&CK Client for SOAx (Smart Enriched Edition)
-# - Intelligent Similarity Matching
-# - Correct STIX Mitigation Extraction
+# - Intelligent Similarity Matching (TF-IDF technique index)
+# - Correct STIX Mitigation Extraction (precomputed lookup tables)
 # - Parent Technique Inheritance for Sub-Techniques
+# - Offline ATT&CK snapshot (no TAXII call at import)
+# - Optional embedding matcher (MITRE_MATCHER=embedding)
 # ============================================================
 
-from attackcti import attack_client
+from functools import lru_cache
 import difflib
+import os
 
-# Initialize ATT&CK Client
-lift = attack_client()
-techniques = lift.get_techniques()
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from RAG.attack_snapshot import load_or_fetch_snapshot
+
+# Cosine score below which no technique is reported
+MIN_MATCH_SCORE = 0.10
+# Cosine score that maps to 100% confidence
+FULL_CONFIDENCE_SCORE = 0.50
+# Rows scored per matrix multiply in batch mode (bounds dense memory)
+BATCH_CHUNK_SIZE = 1024
+
+# "tfidf" (default) or "embedding"
+MITRE_MATCHER = os.getenv("MITRE_MATCHER", "tfidf")
+MATCHERS = ("tfidf", "embedding")
+
+
+# ------------------------------------------------------------
+# ATT&CK data (loaded lazily from the local snapshot)
+# ------------------------------------------------------------
+@lru_cache(maxsize=1)
+def get_snapshot() -> dict:
+    return load_or_fetch_snapshot()
+
+
+def get_techniques() -> list:
+    return get_snapshot()["techniques"]
+
+
+def reload_snapshot():
+    """Drops cached ATT&CK data so the next lookup reads the refreshed file."""
+    get_snapshot.cache_clear()
+    get_tables.cache_clear()
+    get_technique_index.cache_clear()
 
 
 # ------------------------------------------------------------
@@ -24,15 +58,23 @@ def extract_tactic(technique: dict) -> str:
 
 
 # ------------------------------------------------------------
-# Extract mitigations, detection, references
+# External ID (e.g. T1059.003) of a technique
 # ------------------------------------------------------------
-def extract_extra_fields(technique: dict):
-    mitigations = []
+def technique_external_id(technique: dict) -> str:
+    ext_refs = technique.get("external_references", [{}])
+    if ext_refs:
+        return ext_refs[0].get("external_id", "N/A")
+    return "N/A"
+
+
+# ------------------------------------------------------------
+# Build mitigations, detection, references for one technique
+# ------------------------------------------------------------
+def build_extra_fields(technique: dict, mitigations_by_target: dict):
+    mitigations = list(mitigations_by_target.get(technique.get("id", ""), []))
     detection = []
     references = []
 
-    stix_id = technique.get("id", "")
-
     # --- References ---
     for ref in technique.get("external_references", []):
         url = ref.get("url")
@@ -44,19 +86,80 @@ def extract_extra_fields(technique: dict):
     if any(word in desc.lower() for word in ["detect", "monitor"]):
         detection.append(desc)
 
-    # --- Mitigations via STIX relationships ---
-    try:
-        mitigation_objects = lift.get_mitigations_by_technique(stix_id)
-        for m in mitigation_objects:
-            txt = m.get("description") or m.get("name")
-            if txt:
-                mitigations.append(txt)
-    except:
-        pass
-
     return mitigations, detection, references
 
 
+# ------------------------------------------------------------
+# Precomputed lookup tables (one pass over the snapshot)
+# ------------------------------------------------------------
+class AttackTables:
+    """
+    - by_external_id:     "T1059" → technique
+    - parent_by_stix_id:  sub-technique STIX id → parent technique
+    - extra_fields:       STIX id → (mitigations, detection, references)
+    """
+
+    def __init__(self, snapshot: dict):
+        technique_list = snapshot["techniques"]
+        by_stix_id = {t.get("id"): t for t in technique_list}
+        mitigation_by_id = {m.get("id"): m for m in snapshot["mitigations"]}
+
+        # --- Mitigation texts per technique (STIX relationships) ---
+        self.mitigations_by_target = {}
+        subtechnique_of = {}
+        for rel in snapshot["relationships"]:
+            kind = rel.get("relationship_type")
+            if kind == "mitigates":
+                m = mitigation_by_id.get(rel.get("source_ref"))
+                txt = m and (m.get("description") or m.get("name"))
+                if txt:
+                    self.mitigations_by_target.setdefault(rel.get("target_ref"), []).append(txt)
+            elif kind == "subtechnique-of":
+                subtechnique_of[rel.get("source_ref")] = rel.get("target_ref")
+
+        # --- External ID index (first occurrence wins) ---
+        self.by_external_id = {}
+        for t in technique_list:
+            self.by_external_id.setdefault(technique_external_id(t), t)
+
+        # --- Sub-technique → parent ---
+        self.parent_by_stix_id = {}
+        for t in technique_list:
+            external_id = technique_external_id(t)
+            parent = by_stix_id.get(subtechnique_of.get(t.get("id")))
+            if not parent and "." in external_id:
+                parent = self.by_external_id.get(external_id.split(".")[0])
+            if parent:
+                self.parent_by_stix_id[t.get("id")] = parent
+
+        # --- Mitigations / detection / references ---
+        self.extra_fields = {
+            t.get("id"): build_extra_fields(t, self.mitigations_by_target)
+            for t in technique_list
+        }
+
+
+@lru_cache(maxsize=1)
+def get_tables() -> AttackTables:
+    """Builds the lookup tables once per process."""
+    return AttackTables(get_snapshot())
+
+
+# ------------------------------------------------------------
+# Extract mitigations, detection, references
+# ------------------------------------------------------------
+def extract_extra_fields(technique: dict):
+    tables = get_tables()
+
+    fields = tables.extra_fields.get(technique.get("id", ""))
+    if fields is None:
+        fields = build_extra_fields(technique, tables.mitigations_by_target)
+
+    # Copies, so callers never mutate the shared tables
+    mitigations, detection, references = fields
+    return list(mitigations), list(detection), list(references)
+
+
 # ------------------------------------------------------------
 # Helper: Get Parent Technique (for sub-techniques)
 # ------------------------------------------------------------
@@ -70,16 +173,12 @@ def get_parent_technique(external_id: str):
         return None  # already a parent
 
     parent_id = external_id.split(".")[0]  # T1016
-    for t in techniques:
-        ext_refs = t.get("external_references", [{}])
-        if ext_refs and ext_refs[0].get("external_id") == parent_id:
-            return t
-
-    return None
+    return get_tables().by_external_id.get(parent_id)
 
 
 # ------------------------------------------------------------
 # Compute similarity between keyword and technique fields
+# (legacy difflib scorer, kept as the benchmark baseline)
 # ------------------------------------------------------------
 def compute_similarity(keyword: str, technique: dict) -> float:
     name = technique.get("name", "").lower()
@@ -92,47 +191,129 @@ def compute_similarity(keyword: str, technique: dict) -> float:
 
 
 # ------------------------------------------------------------
-# MAIN: Smart MITRE Matching
+# Technique Index (TF-IDF over name + description)
 # ------------------------------------------------------------
-def search_attack_technique(keyword: str) -> dict:
-    keyword = keyword.lower()
-    best_match = None
-    best_score = 0.0
+def technique_text(technique: dict) -> str:
+    name = technique.get("name", "")
+    desc = technique.get("description", "")
+    # Name is repeated so it outweighs the long description
+    return f"{name} {name} {desc}"
 
-    # --- 1) Find best matching technique ---
-    for t in techniques:
-        score = compute_similarity(keyword, t)
-        if score > best_score:
-            best_score = score
-            best_match = t
 
-    # --- 2) No good match ---
-    if not best_match or best_score < 0.30:
-        return {
-            "id": "N/A",
-            "name": "Unknown",
-            "description": "No MITRE technique matched this keyword.",
-            "tactic": "Unknown",
-            "confidence": 40,
-            "mitigations": [],
-            "detection": [],
-            "references": []
-        }
+class TechniqueIndex:
+    """
+    Sparse TF-IDF matrix over the technique corpus.
+    Rows are L2-normalized, so one sparse dot product with a
+    query vector yields the cosine score of every technique.
+    """
+
+    min_score = MIN_MATCH_SCORE
+    full_score = FULL_CONFIDENCE_SCORE
+
+    def __init__(self, technique_list: list):
+        self.techniques = list(technique_list)
+        self.vectorizer = TfidfVectorizer(
+            stop_words="english",
+            ngram_range=(1, 2),
+            sublinear_tf=True
+        )
+        self.matrix = self.vectorizer.fit_transform(
+            [technique_text(t) for t in self.techniques]
+        )
+
+    def best_match(self, keyword: str):
+        """Returns (technique, cosine score) for the closest technique."""
+        query = self.vectorizer.transform([keyword])
+        scores = (self.matrix @ query.T).toarray().ravel()
+
+        best = int(scores.argmax())
+        return self.techniques[best], float(scores[best])
+
+    def top_k(self, keywords: list[str], k: int = 3) -> list[list[tuple]]:
+        """
+        Scores a whole batch with one sparse matrix multiply per chunk.
+        Returns, per keyword, up to k (technique, cosine score) pairs,
+        best first.
+        """
+        k = max(1, min(k, len(self.techniques)))
+        ranked = []
+
+        for start in range(0, len(keywords), BATCH_CHUNK_SIZE):
+            queries = self.vectorizer.transform(keywords[start:start + BATCH_CHUNK_SIZE])
+            scores = (queries @ self.matrix.T).toarray()
+
+            # Unordered top-k per row, then sort just those k
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for idx_row, score_row in zip(top, top_scores):
+                ranked.append([
+                    (self.techniques[i], float(sc))
+                    for i, sc in zip(idx_row, score_row)
+                ])
+
+        return ranked
+
+
+@lru_cache(maxsize=None)
+def get_technique_index(matcher: str = None):
+    """Builds the selected technique index once per process."""
+    matcher = matcher or MITRE_MATCHER
+    if matcher not in MATCHERS:
+        raise ValueError(f"Unknown MITRE_MATCHER '{matcher}', expected one of {MATCHERS}")
+
+    if matcher == "embedding":
+        from RAG.mitre_embeddings import EmbeddingIndex
+
+        technique_list = get_techniques()
+        return EmbeddingIndex(
+            technique_list,
+            [technique_text(t) for t in technique_list],
+            get_snapshot()["version"]
+        )
+
+    return TechniqueIndex(get_techniques())
+
+
+def calibrate_confidence(score: float, full_score: float = FULL_CONFIDENCE_SCORE) -> int:
+    """Maps a cosine score onto the 0-100 confidence scale."""
+    return int(round(min(score / full_score, 1.0) * 100))
+
+
+# ------------------------------------------------------------
+# Enriched result for one matched technique
+# ------------------------------------------------------------
+def no_match_result() -> dict:
+    return {
+        "id": "N/A",
+        "name": "Unknown",
+        "description": "No MITRE technique matched this keyword.",
+        "tactic": "Unknown",
+        "confidence": 40,
+        "mitigations": [],
+        "detection": [],
+        "references": []
+    }
+
 
-    # --- 3) Extract main technique info ---
-    ext = best_match.get("external_references", [{}])[0]
-    external_id = ext.get("external_id", "N/A")
-    name = best_match.get("name", "Unknown")
-    description = best_match.get("description", "")
-    tactic = extract_tactic(best_match)
-    confidence = int(best_score * 100)
+def build_technique_result(technique: dict, score: float,
+                           full_score: float = FULL_CONFIDENCE_SCORE) -> dict:
+    # --- 1) Extract main technique info ---
+    external_id = technique_external_id(technique)
+    name = technique.get("name", "Unknown")
+    description = technique.get("description", "")
+    tactic = extract_tactic(technique)
+    confidence = calibrate_confidence(score, full_score)
 
-    # --- 4) Extract fields from the sub-technique ---
-    mitigations, detection, references = extract_extra_fields(best_match)
+    # --- 2) Extract fields from the sub-technique ---
+    mitigations, detection, references = extract_extra_fields(technique)
 
-    # --- 5) Smart Mode: Inherit from Parent if empty ---
+    # --- 3) Smart Mode: Inherit from Parent if empty ---
     if (not mitigations or not detection) and "." in external_id:
-        parent = get_parent_technique(external_id)
+        parent = get_tables().parent_by_stix_id.get(technique.get("id"))
         if parent:
             pm, pd, pr = extract_extra_fields(parent)
 
@@ -143,7 +324,7 @@ def search_attack_technique(keyword: str) -> dict:
             if not references:
                 references = pr
 
-    # --- 6) Return enriched technique ---
+    # --- 4) Return enriched technique ---
     return {
         "id": external_id,
         "name": name,
@@ -154,3 +335,50 @@ def search_attack_technique(keyword: str) -> dict:
         "detection": detection,
         "references": references
     }
+
+
+# ------------------------------------------------------------
+# MAIN: Smart MITRE Matching
+# ------------------------------------------------------------
+def search_attack_technique(keyword: str, matcher: str = None) -> dict:
+    keyword = keyword.lower()
+    index = get_technique_index(matcher)
+
+    # --- 1) Find best matching technique ---
+    best_match, best_score = index.best_match(keyword)
+
+    # --- 2) No good match ---
+    if not best_match or best_score < index.min_score:
+        return no_match_result()
+
+    # --- 3) Enrich the match ---
+    return build_technique_result(best_match, best_score, index.full_score)
+
+
+# ------------------------------------------------------------
+# BATCH: Top-k MITRE Matching for many alerts at once
+# ------------------------------------------------------------
+def search_attack_techniques(descriptions: list[str], k: int = 3,
+                             matcher: str = None) -> list[list[dict]]:
+    """
+    Scores every description against the technique corpus in one
+    vectorized pass.
+
+    Returns one ranked candidate list per description. Each candidate has
+    the search_attack_technique shape plus a raw cosine "score". A
+    description with no candidate above the matcher's minimum score gets
+    the single "Unknown" result, so every list is non-empty.
+    """
+    index = get_technique_index(matcher)
+    ranked = index.top_k([d.lower() for d in descriptions], k)
+
+    results = []
+    for candidates in ranked:
+        row = [
+            {**build_technique_result(t, score, index.full_score), "score": round(score, 4)}
+            for t, score in candidates
+            if score >= index.min_score
+        ]
+        results.append(row or [{**no_match_result(), "score": 0.0}])
+
+    return results
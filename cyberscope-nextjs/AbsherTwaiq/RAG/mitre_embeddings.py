@@ -0,0 +1,132 @@
+# ============================================================
+# RAG/mitre_embeddings.py
+# Embedding-based MITRE retrieval for SOAx (optional matcher)
+# - Small local CPU sentence-embedding model (huggingface_cache)
+# - Technique vectors embedded once, persisted as .npy
+# - Opened with mmap_mode so workers share the pages
+# - Batched cosine similarity for alert descriptions
+#
+# Select it with MITRE_MATCHER=embedding (see mitre_client.py)
+# ============================================================
+
+import os
+import re
+import numpy as np
+
+from RAG.attack_snapshot import SNAPSHOT_PATH
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HF_CACHE_DIR = os.path.join(BASE_DIR, "huggingface_cache")
+
+EMBEDDING_MODEL = os.getenv(
+    "MITRE_EMBEDDING_MODEL",
+    "sentence-transformers/all-MiniLM-L6-v2"
+)
+
+# Sentence-embedding cosines sit much higher than TF-IDF ones
+EMBEDDING_MIN_SCORE = 0.25
+EMBEDDING_FULL_SCORE = 0.65
+
+EMBED_BATCH_SIZE = 64
+MAX_TOKENS = 256
+
+
+# ------------------------------------------------------------
+# Local encoder (mean pooling over the last hidden state)
+# ------------------------------------------------------------
+class SentenceEncoder:
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        # Optional dependencies: only needed for this matcher
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=HF_CACHE_DIR)
+        self.model = AutoModel.from_pretrained(model_name, cache_dir=HF_CACHE_DIR)
+        self.model.eval()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Returns L2-normalized float32 vectors, one row per text."""
+        chunks = []
+
+        with self.torch.inference_mode():
+            for start in range(0, len(texts), EMBED_BATCH_SIZE):
+                batch = self.tokenizer(
+                    texts[start:start + EMBED_BATCH_SIZE],
+                    padding=True,
+                    truncation=True,
+                    max_length=MAX_TOKENS,
+                    return_tensors="pt"
+                )
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).type_as(hidden)
+                pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+                pooled = self.torch.nn.functional.normalize(pooled, dim=1)
+                chunks.append(pooled.numpy().astype(np.float32))
+
+        if not chunks:
+            # Keep the embedding width so an empty batch still multiplies
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        return np.vstack(chunks)
+
+
+# ------------------------------------------------------------
+# Persisted technique matrix (one file per model + snapshot)
+# ------------------------------------------------------------
+def embeddings_path(model_name: str, snapshot_version: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", model_name).strip("_")
+    return os.path.join(
+        os.path.dirname(SNAPSHOT_PATH),
+        f"technique_embeddings_{slug}_{snapshot_version}.npy"
+    )
+
+
+def load_or_build_embeddings(encoder, texts: list[str], path: str) -> np.ndarray:
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, encoder.encode(texts))
+        os.replace(tmp_path, path)
+
+    return np.load(path, mmap_mode="r")
+
+
+# ------------------------------------------------------------
+# Embedding Index (same interface as mitre_client.TechniqueIndex)
+# ------------------------------------------------------------
+class EmbeddingIndex:
+
+    min_score = EMBEDDING_MIN_SCORE
+    full_score = EMBEDDING_FULL_SCORE
+
+    def __init__(self, technique_list: list, texts: list[str], snapshot_version: str,
+                 model_name: str = EMBEDDING_MODEL):
+        self.techniques = list(technique_list)
+        self.encoder = SentenceEncoder(model_name)
+        self.matrix = load_or_build_embeddings(
+            self.encoder, texts, embeddings_path(model_name, snapshot_version)
+        )
+
+    def best_match(self, keyword: str):
+        """Returns (technique, cosine score) for the closest technique."""
+        return self.top_k([keyword], k=1)[0][0]
+
+    def top_k(self, keywords: list[str], k: int = 3) -> list[list[tuple]]:
+        """Batched cosine similarity; up to k (technique, score) per keyword."""
+        if not keywords:
+            return []
+        k = max(1, min(k, len(self.techniques)))
+        scores = self.encoder.encode(keywords) @ self.matrix.T
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(self.techniques[i], float(sc)) for i, sc in zip(idx_row, score_row)]
+            for idx_row, score_row in zip(top, top_scores)
+        ]
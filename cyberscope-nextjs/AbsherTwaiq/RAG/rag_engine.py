@@ -5,8 +5,8 @@
 # Fully compatible with SOAx_data_schema.py
 # =======================================================
 
-from RAG.mitre_client import search_attack_technique
-from RAG.virustotal_client import VTClient
+from RAG.mitre_client import search_attack_technique, search_attack_techniques
+from RAG.vt_scheduler import VTScheduler, get_scheduler
 
 from framework.SOAx_data_schema import (
     AlertSchema,
@@ -15,44 +15,78 @@ from framework.SOAx_data_schema import (
 )
 
 
-class ThreatRAG:
+# ---------------------------------------------------
+# Normalize raw MITRE output into MitreSchema
+# ---------------------------------------------------
+def normalize_mitre(mitre_raw: dict) -> MitreSchema:
+    return {
+        "id": mitre_raw.get("id"),
+        "name": mitre_raw.get("name"),
+        "tactic": mitre_raw.get("tactic"),
+        "confidence": mitre_raw.get("confidence"),
 
-    def __init__(self):
-        self.vt = VTClient()
+        # UI-Only Fields
+        "description": mitre_raw.get("description"),
+        "mitigations": mitre_raw.get("mitigations", []),
+        "detection": mitre_raw.get("detection", []),
+        "references": mitre_raw.get("references", []),
+    }
 
-    # ---------------------------------------------------
-    # Enrich Alert with MITRE + VirusTotal (FULL DATA)
-    # ---------------------------------------------------
-    def enrich_alert(self, alert: AlertSchema) -> dict:
 
-        description = alert.get("description", "")
-        source_ip = alert.get("source_ip", "")
+# ---------------------------------------------------
+# Batch MITRE enrichment (one matrix multiply)
+# ---------------------------------------------------
+def match_mitre_batch(alerts: list[AlertSchema]) -> list[MitreSchema]:
+    """Best MITRE technique for every alert, scored in one batch."""
+    candidates = search_attack_techniques(
+        [a.get("description", "") for a in alerts], k=1
+    )
+    return [normalize_mitre(c[0]) for c in candidates]
 
-        # -----------------------
-        # 🔥 MITRE ENRICHMENT
-        # -----------------------
-        mitre_raw = search_attack_technique(description)
 
-        # Prepare normalized MITRE schema
-        mitre: MitreSchema = {
-            "id": mitre_raw.get("id"),
-            "name": mitre_raw.get("name"),
-            "tactic": mitre_raw.get("tactic"),
-            "confidence": mitre_raw.get("confidence"),
+# ---------------------------------------------------
+# VT quota priority: stronger MITRE matches go first
+# ---------------------------------------------------
+def alert_priority(mitre: dict) -> int:
+    if not mitre or mitre.get("id") in (None, "N/A"):
+        return 0
+    return int(mitre.get("confidence") or 0)
 
-            # UI-Only Fields
-            "description": mitre_raw.get("description"),
-            "mitigations": mitre_raw.get("mitigations", []),
-            "detection": mitre_raw.get("detection", []),
-            "references": mitre_raw.get("references", []),
-        }
 
-        # -----------------------
-        # 🔥 VIRUSTOTAL ENRICHMENT
-        # -----------------------
-        vt_raw = self.vt.scan_ip(source_ip)
+# ---------------------------------------------------
+# Queue VT lookups for a batch ahead of the pipeline
+# ---------------------------------------------------
+def prefetch_reputation(alerts: list[AlertSchema], mitre_batch: list[MitreSchema],
+                        scheduler: VTScheduler = None):
+    """Submits every source IP now; later scan_ip calls join the same lookups."""
+    scheduler = scheduler or get_scheduler()
+    for alert, mitre in zip(alerts, mitre_batch):
+        scheduler.prefetch(alert.get("source_ip", ""), priority=alert_priority(mitre))
 
-        vt: VirusTotalSchema = {
+
+class ThreatRAG:
+
+    def __init__(self, vt: VTScheduler = None):
+        # Shared, quota-aware VT access (one per process by default)
+        self.vt = vt or get_scheduler()
+
+    # ---------------------------------------------------
+    # MITRE enrichment (CPU: local index)
+    # ---------------------------------------------------
+    def enrich_mitre(self, alert: AlertSchema, mitre_raw: dict = None) -> MitreSchema:
+        """mitre_raw: optional precomputed match (e.g. match_mitre_batch)."""
+        if mitre_raw is None:
+            mitre_raw = search_attack_technique(alert.get("description", ""))
+
+        return normalize_mitre(mitre_raw)
+
+    # ---------------------------------------------------
+    # VirusTotal enrichment (network: scheduler / cache)
+    # ---------------------------------------------------
+    def enrich_virustotal(self, alert: AlertSchema, priority: int = 0) -> VirusTotalSchema:
+        vt_raw = self.vt.scan_ip(alert.get("source_ip", ""), priority=priority)
+
+        return {
             # AI-Important Fields
             "malicious": vt_raw.get("malicious", 0),
             "suspicious": vt_raw.get("suspicious", 0),
@@ -73,6 +107,17 @@ class ThreatRAG:
             "whois": vt_raw.get("whois"),
         }
 
+    # ---------------------------------------------------
+    # Enrich Alert with MITRE + VirusTotal (FULL DATA)
+    # ---------------------------------------------------
+    def enrich_alert(self, alert: AlertSchema, mitre_raw: dict = None) -> dict:
+        """
+        mitre_raw: optional MITRE result already computed for this alert
+        (e.g. by match_mitre_batch); skips the per-alert MITRE match.
+        """
+        mitre = self.enrich_mitre(alert, mitre_raw)
+        vt = self.enrich_virustotal(alert, priority=alert_priority(mitre))
+
         # -----------------------
         # RETURN UNIFIED RESULT
         # -----------------------
@@ -81,3 +126,13 @@ class ThreatRAG:
             "mitre": mitre,
             "virustotal": vt
         }
+
+    # ---------------------------------------------------
+    # Enrich many alerts (MITRE scored as one batch)
+    # ---------------------------------------------------
+    def enrich_alerts(self, alerts: list[AlertSchema]) -> list[dict]:
+        mitre_batch = match_mitre_batch(alerts)
+        return [
+            self.enrich_alert(alert, mitre_raw=mitre)
+            for alert, mitre in zip(alerts, mitre_batch)
+        ]
@@ -3,27 +3,252 @@
 # Returns FULL VT data in VirusTotalSchema format:
 # - AI fields (malicious, suspicious, clean, score)
 # - UI fields (WHOIS, ASN, country, feeds...)
+# - Pooled HTTP session (keep-alive) + asyncio batch variant
+# - Persistent SQLite reputation cache (TTL + stale-while-revalidate)
+# - Private / reserved / internal IPs answered locally (no VT call)
 # ============================================================
 
 import os
+import json
+import ipaddress
+import time
+import sqlite3
+import asyncio
+import threading
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 from framework.SOAx_data_schema import VirusTotalSchema
 
 load_dotenv()
 VT_API_KEY = os.getenv("VT_API_KEY")
+VT_BASE_URL = "https://www.virustotal.com/api/v3"
+
+# Seconds per VT request (connect + read)
+VT_TIMEOUT = 10
+# Keep-alive connections held open to VT
+VT_POOL_SIZE = 20
+# IPs enriched at once by scan_ips_async
+VT_CONCURRENCY = 8
+
+# Reputation cache
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VT_CACHE_PATH = os.getenv("VT_CACHE_PATH", os.path.join(BASE_DIR, "storage", "vt_cache.sqlite3"))
+VT_CACHE_ENABLED = os.getenv("VT_CACHE", "1") != "0"
+VT_MALICIOUS_TTL = int(os.getenv("VT_MALICIOUS_TTL", 6 * 3600))     # flagged IPs change fast
+VT_CLEAN_TTL = int(os.getenv("VT_CLEAN_TTL", 7 * 24 * 3600))
+VT_MAX_STALE = int(os.getenv("VT_MAX_STALE", 7 * 24 * 3600))        # past expiry, still servable
+
+# Our own ranges (comma-separated CIDRs), e.g. "185.77.14.0/24,2001:db8::/32"
+VT_INTERNAL_CIDRS = os.getenv("VT_INTERNAL_CIDRS", "")
+
+
+# ============================================================
+# IP classification (before any VT lookup)
+# ============================================================
+def parse_networks(cidrs) -> list:
+    if isinstance(cidrs, str):
+        cidrs = [c for c in (x.strip() for x in cidrs.split(",")) if c]
+    return [ipaddress.ip_network(c, strict=False) for c in cidrs]
+
+
+def classify_ip(ip: str, internal_networks: list = ()):
+    """
+    Returns (kind, network) where kind is one of:
+        "invalid", "internal", "private", "loopback", "link-local",
+        "multicast", "reserved", "public"
+    network is the matching allow-list entry for "internal" and the
+    address's /24 (IPv4) or /64 (IPv6) otherwise.
+    """
+    try:
+        addr = ipaddress.ip_address(ip.strip())
+    except (ValueError, AttributeError):
+        return "invalid", None
+
+    for net in internal_networks:
+        if addr.version == net.version and addr in net:
+            return "internal", net
+
+    prefix = 24 if addr.version == 4 else 64
+    network = ipaddress.ip_network(f"{addr}/{prefix}", strict=False)
+
+    if addr.is_loopback:
+        return "loopback", network
+    if addr.is_link_local:
+        return "link-local", network
+    if addr.is_multicast:
+        return "multicast", network
+    if addr.is_private:
+        return "private", network
+    if addr.is_global:
+        return "public", network
+    # Unspecified, CGNAT, documentation, other IANA special-purpose
+    return "reserved", network
+
+
+# ============================================================
+# SQLite-backed IP reputation cache
+# ============================================================
+class VTReputationCache:
+    """
+    Maps IP → normalized VirusTotalSchema dict.
+
+    Flagged verdicts (malicious or suspicious > 0) expire after
+    malicious_ttl, clean ones after clean_ttl. Expired entries stay
+    readable for max_stale seconds so callers can serve them while a
+    refresh runs (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        path: str = VT_CACHE_PATH,
+        malicious_ttl: int = VT_MALICIOUS_TTL,
+        clean_ttl: int = VT_CLEAN_TTL,
+        max_stale: int = VT_MAX_STALE
+    ):
+        self.path = path
+        self.malicious_ttl = malicious_ttl
+        self.clean_ttl = clean_ttl
+        self.max_stale = max_stale
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vt_reputation (
+                ip         TEXT PRIMARY KEY,
+                record     TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def ttl_for(self, record: VirusTotalSchema) -> int:
+        flagged = (record.get("malicious") or 0) + (record.get("suspicious") or 0)
+        return self.malicious_ttl if flagged > 0 else self.clean_ttl
+
+    def get(self, ip: str, allow_stale: bool = True):
+        """
+        Returns (record, fresh) or None.
+        fresh is False for an expired entry still inside max_stale;
+        with allow_stale=False such an entry is a miss (nothing served).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record, expires_at FROM vt_reputation WHERE ip = ?", (ip,)
+            ).fetchone()
+
+            now = time.time()
+            fresh = row is not None and now <= row[1]
+            if row is None or now > row[1] + (self.max_stale if allow_stale else 0):
+                self.misses += 1
+                return None
+
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+
+        return json.loads(row[0]), fresh
+
+    def put(self, ip: str, record: VirusTotalSchema):
+        self.put_many([(ip, record)])
+
+    def put_many(self, items: list[tuple[str, VirusTotalSchema]]):
+        """Stores (ip, record) pairs in one transaction."""
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (ip, json.dumps(record, ensure_ascii=False), now, now + self.ttl_for(record))
+            for ip, record in items
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vt_reputation VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
 
 class VTClient:
 
-    def __init__(self):
-        if not VT_API_KEY:
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = VT_BASE_URL,
+        timeout: float = VT_TIMEOUT,
+        pool_size: int = VT_POOL_SIZE,
+        cache: VTReputationCache = None,
+        use_cache: bool = VT_CACHE_ENABLED,
+        stale_while_revalidate: bool = False,
+        internal_cidrs=VT_INTERNAL_CIDRS
+    ):
+        api_key = api_key or VT_API_KEY
+        if not api_key:
             raise Exception("VT_API_KEY not found in .env")
 
-        self.base_url = "https://www.virustotal.com/api/v3"
-        self.headers = {"x-apikey": VT_API_KEY}
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"x-apikey": api_key}
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        # One pooled session: TCP/TLS handshakes are reused across calls
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Reputation cache (survives restarts)
+        if cache is None and use_cache:
+            cache = VTReputationCache()
+        self.cache = cache
+        self.stale_while_revalidate = stale_while_revalidate
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vt-revalidate")
+
+        # Non-public and allow-listed IPs never reach VT
+        self.internal_networks = parse_networks(internal_cidrs)
+        self.local_answers = 0
+
+    def close(self):
+        self._refresher.shutdown(wait=True)
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     # ---------------------------------------------------------
     # WHOIS Parser
@@ -56,54 +281,207 @@ class VTClient:
     # ---------------------------------------------------------
     # Get comment count (for community feeds)
     # ---------------------------------------------------------
+    @staticmethod
+    def comments_count_from(data: dict) -> int:
+        meta = data.get("meta", {})
+
+        if "count" in meta:
+            return meta.get("count", 0)
+
+        return len(data.get("data", []))
+
     def get_ip_comments_count(self, ip: str) -> int:
         url = f"{self.base_url}/ip_addresses/{ip}/comments"
 
         try:
-            resp = requests.get(url, headers=self.headers)
+            resp = self.session.get(url, timeout=self.timeout)
             if resp.status_code != 200:
                 return 0
 
-            data = resp.json()
-            meta = data.get("meta", {})
-
-            if "count" in meta:
-                return meta.get("count", 0)
-
-            return len(data.get("data", []))
+            return self.comments_count_from(resp.json())
 
         except:
             return 0
 
+    # ---------------------------------------------------------
+    # Empty record (VT error / unknown IP)
+    # ---------------------------------------------------------
+    @staticmethod
+    def empty_result(ip: str) -> VirusTotalSchema:
+        return {
+            "malicious": 0,
+            "suspicious": 0,
+            "clean": 0,
+            "community_score": 0,
+            "malicious_vendors_count": "0/0",
+
+            "ip_address": ip,
+            "asn": None,
+            "organization": None,
+            "country": None,
+            "ip_range": None,
+            "last_analysis_date": "N/A",
+            "community_feeds": 0,
+            "voting_details": 0,
+            "comments_count": 0,
+            "whois": {}
+        }
+
+    # ---------------------------------------------------------
+    # Local answer for non-public IPs (no network round-trip)
+    # ---------------------------------------------------------
+    def local_result(self, ip: str):
+        """Returns a VirusTotalSchema for non-public IPs, None for public ones."""
+        kind, network = classify_ip(ip, self.internal_networks)
+        if kind == "public":
+            return None
+
+        self.local_answers += 1
+        result = self.empty_result(ip)
+        if kind == "invalid":
+            return result
+
+        owner = "Internal asset" if kind == "internal" else f"Non-routable ({kind})"
+        result.update({
+            "malicious_vendors_count": f"0/0 vendors flagged ({kind} address, not scanned)",
+            "organization": owner,
+            "ip_range": str(network),
+            "whois": {"CIDR": str(network), "NetType": owner}
+        })
+        return result
+
     # ---------------------------------------------------------
     # MAIN ANALYSIS FUNCTION
     # ---------------------------------------------------------
     def scan_ip(self, ip: str) -> VirusTotalSchema:
 
+        local = self.local_result(ip)
+        if local is not None:
+            return local
+
+        cached = self.cached_result(ip)
+        if cached is not None:
+            return cached
+
+        record = self.fetch_ip(ip)
+        if record is None:
+            return self.empty_result(ip)
+
+        if self.cache:
+            self.cache.put(ip, record)
+        return record
+
+    def fetch_ip(self, ip: str):
+        """Live VT lookup. Returns None on error so failures are never cached."""
         url = f"{self.base_url}/ip_addresses/{ip}"
-        response = requests.get(url, headers=self.headers)
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            return None
 
         if response.status_code != 200:
-            return {
-                "malicious": 0,
-                "suspicious": 0,
-                "clean": 0,
-                "community_score": 0,
-                "malicious_vendors_count": "0/0",
-
-                "ip_address": ip,
-                "asn": None,
-                "organization": None,
-                "country": None,
-                "ip_range": None,
-                "last_analysis_date": "N/A",
-                "community_feeds": 0,
-                "voting_details": 0,
-                "comments_count": 0,
-                "whois": {}
-            }
-
-        data = response.json()
+            return None
+
+        comments_count = self.get_ip_comments_count(ip)
+        return self.build_result(ip, response.json(), comments_count)
+
+    # ---------------------------------------------------------
+    # Cache lookup (+ background refresh of stale entries)
+    # ---------------------------------------------------------
+    def cached_result(self, ip: str):
+        if not self.cache:
+            return None
+
+        # Without stale-while-revalidate an expired entry is a plain miss
+        cached = self.cache.get(ip, allow_stale=self.stale_while_revalidate)
+        if cached is None:
+            return None
+
+        record, fresh = cached
+        if not fresh:
+            self.revalidate(ip)
+        return record
+
+    def revalidate(self, ip: str):
+        """Refreshes one IP in the background (one refresh per IP at a time)."""
+        with self._refresh_lock:
+            if ip in self._refreshing:
+                return
+            self._refreshing.add(ip)
+
+        def refresh():
+            try:
+                record = self.fetch_ip(ip)
+                if record is not None:
+                    self.cache.put(ip, record)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(ip)
+
+        self._refresher.submit(refresh)
+
+    # ---------------------------------------------------------
+    # ASYNC: many IPs, report + comments fetched concurrently
+    # ---------------------------------------------------------
+    async def scan_ips_async(self, ips: list[str], concurrency: int = VT_CONCURRENCY) -> list[VirusTotalSchema]:
+        """
+        Enriches many IPs with at most `concurrency` IPs in flight.
+        For each IP the report and the comments count are requested
+        concurrently. Results keep the input order. New records are
+        cached in one write, off the event loop.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(
+            max_connections=max(self.pool_size, concurrency * 2),
+            max_keepalive_connections=self.pool_size
+        )
+
+        async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout, limits=limits) as client:
+
+            async def fetch(url: str):
+                try:
+                    resp = await client.get(url)
+                    return resp.json() if resp.status_code == 200 else None
+                except (httpx.HTTPError, ValueError):
+                    # ValueError: a 200 whose body is not JSON (proxy / error page)
+                    return None
+
+            async def scan_one(ip: str) -> VirusTotalSchema:
+                local = self.local_result(ip)
+                if local is not None:
+                    return local
+
+                cached = self.cached_result(ip)
+                if cached is not None:
+                    return cached
+
+                async with semaphore:
+                    url = f"{self.base_url}/ip_addresses/{ip}"
+                    report, comments = await asyncio.gather(fetch(url), fetch(f"{url}/comments"))
+
+                if report is None:
+                    return self.empty_result(ip)
+
+                comments_count = self.comments_count_from(comments) if comments else 0
+                record = self.build_result(ip, report, comments_count)
+                fetched.append((ip, record))
+                return record
+
+            fetched = []
+            results = await asyncio.gather(*(scan_one(ip) for ip in ips))
+
+        if self.cache:
+            await asyncio.to_thread(self.cache.put_many, fetched)
+        return results
+
+    def scan_ips(self, ips: list[str], concurrency: int = VT_CONCURRENCY) -> list[VirusTotalSchema]:
+        """Blocking wrapper around scan_ips_async."""
+        return asyncio.run(self.scan_ips_async(ips, concurrency))
+
+    # ---------------------------------------------------------
+    # VT JSON → VirusTotalSchema
+    # ---------------------------------------------------------
+    def build_result(self, ip: str, data: dict, comments_count: int) -> VirusTotalSchema:
         attr = data.get("data", {}).get("attributes", {})
         stats = attr.get("last_analysis_stats", {})
 
@@ -127,7 +505,6 @@ class VTClient:
 
         # Voting + comments = community_feeds
         voting_details = harmless_votes + malicious_votes
-        comments_count = self.get_ip_comments_count(ip)
         community_feeds = voting_details + comments_count
 
         # Basic info
@@ -147,11 +524,8 @@ class VTClient:
         if isinstance(network_info, str) and "/" in network_info:
             ip_range = network_info
         else:
-            try:
-                p = ip.split(".")
-                ip_range = f"{p[0]}.{p[1]}.{p[2]}.0/24"
-            except:
-                ip_range = "N/A"
+            _, network = classify_ip(ip)
+            ip_range = str(network) if network else "N/A"
 
         whois_raw = attr.get("whois", "")
         whois_parsed = self.parse_whois(whois_raw)
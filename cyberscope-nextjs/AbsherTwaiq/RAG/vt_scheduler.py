@@ -0,0 +1,261 @@
+# ============================================================
+# RAG/vt_scheduler.py
+# Quota-aware VirusTotal Request Scheduler for SOAx
+# - Token bucket matching the account's requests-per-minute
+# - Identical in-flight lookups coalesced into one future
+# - Priority queue: high-risk alerts get quota first
+# - Metrics: queue wait time, VT calls saved
+# ============================================================
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+
+from RAG.virustotal_client import VTClient
+from framework.SOAx_data_schema import VirusTotalSchema
+
+# VT public API: 4 lookups/min; premium keys set their own quota
+VT_REQUESTS_PER_MINUTE = int(os.getenv("VT_REQUESTS_PER_MINUTE", 4))
+VT_SCHEDULER_WORKERS = int(os.getenv("VT_SCHEDULER_WORKERS", 4))
+
+# One IP lookup = IP report + comments
+REQUESTS_PER_LOOKUP = 2
+# IPs remembered between a prefetch and its scan_ip (metrics only)
+PREFETCH_TRACK_LIMIT = 10_000
+
+
+# ------------------------------------------------------------
+# Token bucket (thread-safe, blocking acquire)
+# ------------------------------------------------------------
+class TokenBucket:
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(capacity or rate_per_minute, REQUESTS_PER_LOOKUP)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1, stop: threading.Event = None) -> bool:
+        """Blocks until `tokens` are taken; False if `stop` is set first."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
+
+
+# ------------------------------------------------------------
+# Scheduler
+# ------------------------------------------------------------
+class VTScheduler:
+    """
+    Drop-in for VTClient.scan_ip in front of one shared client.
+
+    Local answers (non-public IPs) and cache hits return at once and
+    cost no quota. A lookup for an IP already queued or in flight
+    shares that lookup's future. Everything else waits in a priority
+    queue (higher priority first, FIFO within a priority) until the
+    token bucket releases quota.
+
+    prefetch() queues a lookup ahead of the scan_ip that will consume
+    it; the pair counts as one logical request in the metrics, so
+    prefetching never shows up as coalesced or locally served calls.
+    """
+
+    def __init__(
+        self,
+        client: VTClient = None,
+        requests_per_minute: int = VT_REQUESTS_PER_MINUTE,
+        workers: int = VT_SCHEDULER_WORKERS
+    ):
+        self.client = client or VTClient()
+        self.bucket = TokenBucket(requests_per_minute)
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stop = threading.Event()
+        # ip -> prefetches whose scan_ip has not arrived yet
+        self._prefetched = {}
+
+        # --- Metrics ---
+        self.submitted = 0
+        self.served_locally = 0
+        self.coalesced = 0
+        self.vt_lookups = 0
+        self._waits = deque(maxlen=10_000)
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"vt-scheduler-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for w in self._workers:
+            w.start()
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    def submit(self, ip: str, priority: int = 0, prefetch: bool = False) -> Future:
+        with self._cond:
+            # The follow-up to a prefetch was counted with the prefetch
+            counted = not self._take_prefetch(ip)
+            if prefetch:
+                self._track_prefetch(ip)
+            if counted:
+                self.submitted += 1
+
+            future = self._in_flight.get(ip)
+            if future is not None:
+                if counted:
+                    self.coalesced += 1
+                return future
+
+        # Local / cached answers never touch the quota
+        answer = self.client.local_result(ip)
+        if answer is None:
+            answer = self.client.cached_result(ip)
+        if answer is not None:
+            if counted:
+                with self._cond:
+                    self.served_locally += 1
+            future = Future()
+            future.set_result(answer)
+            return future
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("VTScheduler is closed")
+
+            # Another thread may have queued it meanwhile
+            future = self._in_flight.get(ip)
+            if future is not None:
+                if counted:
+                    self.coalesced += 1
+                return future
+
+            future = Future()
+            self._in_flight[ip] = future
+            heapq.heappush(self._queue, (-priority, next(self._seq), time.monotonic(), ip, future))
+            self._cond.notify()
+            return future
+
+    def prefetch(self, ip: str, priority: int = 0) -> Future:
+        """Queues a lookup now for a scan_ip(ip) that follows later."""
+        return self.submit(ip, priority, prefetch=True)
+
+    def scan_ip(self, ip: str, priority: int = 0) -> VirusTotalSchema:
+        return self.submit(ip, priority).result()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            queued = len(self._queue)
+
+        return {
+            "submitted": self.submitted,
+            "vt_lookups": self.vt_lookups,
+            "served_locally": self.served_locally,
+            "coalesced": self.coalesced,
+            "calls_saved": self.served_locally + self.coalesced,
+            "queued": queued,
+            "queue_wait_avg_s": sum(waits) / len(waits) if waits else 0.0,
+            "queue_wait_p95_s": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "queue_wait_max_s": waits[-1] if waits else 0.0,
+        }
+
+    def close(self, close_client: bool = True):
+        """
+        Stops at once: queued lookups are cancelled (their waiters get
+        CancelledError) rather than drained at the quota rate, and
+        workers waiting for tokens give up.
+        """
+        with self._cond:
+            self._closed = True
+            queued, self._queue = self._queue, []
+            for *_, ip, future in queued:
+                self._in_flight.pop(ip, None)
+                future.cancel()
+            self._prefetched.clear()
+            self._stop.set()
+            self._cond.notify_all()
+        for w in self._workers:
+            w.join()
+        if close_client:
+            self.client.close()
+
+    def _track_prefetch(self, ip: str):
+        self._prefetched[ip] = self._prefetched.get(ip, 0) + 1
+        # Prefetches never followed up (alert failed first) age out
+        if len(self._prefetched) > PREFETCH_TRACK_LIMIT:
+            del self._prefetched[next(iter(self._prefetched))]
+
+    def _take_prefetch(self, ip: str) -> bool:
+        pending = self._prefetched.get(ip)
+        if not pending:
+            return False
+        if pending == 1:
+            del self._prefetched[ip]
+        else:
+            self._prefetched[ip] = pending - 1
+        return True
+
+    # ---------------------------------------------------------
+    # Worker loop
+    # ---------------------------------------------------------
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                _, _, enqueued_at, ip, future = heapq.heappop(self._queue)
+
+            if not self.bucket.acquire(REQUESTS_PER_LOOKUP, stop=self._stop):
+                with self._cond:
+                    self._in_flight.pop(ip, None)
+                future.cancel()
+                return
+
+            with self._cond:
+                self._waits.append(time.monotonic() - enqueued_at)
+                self.vt_lookups += 1
+
+            try:
+                record = self.client.fetch_ip(ip)
+                if record is None:
+                    record = self.client.empty_result(ip)
+                elif self.client.cache:
+                    self.client.cache.put(ip, record)
+                future.set_result(record)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._in_flight.pop(ip, None)
+
+
+# ------------------------------------------------------------
+# Process-wide scheduler (one quota per API key)
+# ------------------------------------------------------------
+@lru_cache(maxsize=1)
+def get_scheduler() -> VTScheduler:
+    return VTScheduler()
@@ -2,43 +2,169 @@
 # analyze.py
 # Batch Analyzer for SOAx
 # Runs all alerts through the SOAx Agent Pipeline
+# (async, bounded number of alerts in flight)
+# - Input streamed in micro-batches: JSON array, JSONL,
+#   a followed JSONL file (--follow) or stdin ("-")
 # ============================================================
 
-import json
-from framework.run_agent import run_alert
+import os
+import sys
+import signal
+import asyncio
+import argparse
+from framework.run_agent import ANALYZE_CONCURRENCY, run_alerts, run_alerts_packed
+from framework.alert_stream import (
+    ANALYZE_BATCH_SIZE,
+    ANALYZE_BATCH_WAIT,
+    analyze_stream,
+    count_alerts,
+    open_source
+)
+from RAG.rag_engine import match_mitre_batch, prefetch_reputation
+from framework.resources import get_resources, close_resources
+from storage.run_checkpoint import RunCheckpoint, alert_fingerprints
+from storage.history_store import get_history_writer
 from framework.SOAx_data_schema import AlertSchema
 
 
 ALERTS_FILE = "alert.json"
 
 
-def load_alerts() -> list[AlertSchema]:
-    """Loads alerts from alert.json."""
-    with open(ALERTS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_alerts(path: str = ALERTS_FILE) -> list[AlertSchema]:
+    """Loads every alert into memory (packed mode needs them all)."""
+    return list(open_source(path))
 
 
-def analyze_all_alerts():
-    """Runs every alert in alert.json through the SOAx Agent."""
+def analyze_all_alerts(pack_size: int = 1, concurrency: int = ANALYZE_CONCURRENCY,
+                       verbose: bool = False, checkpoint: RunCheckpoint = None,
+                       path: str = ALERTS_FILE):
+    """
+    Runs every alert in `path` (alert.json) through the SOAx Agent, with up to
+    `concurrency` alerts in flight. Results keep alert.json order.
+    pack_size > 1 analyzes that many alerts per LLM request.
+    verbose prints each alert's full final state.
+
+    checkpoint: alerts it records as done are skipped before any MITRE,
+    VT or LLM work; failed ones run again. Returns results for the
+    alerts run this time only.
+    """
     
-    alerts = load_alerts()
+    alerts = load_alerts(path)
     print(f"\n📌 Loaded {len(alerts)} alerts.\n")
 
-    results = []
+    if pack_size > 1:
+        return run_alerts_packed(alerts, pack_size=pack_size)
+
+    fingerprints = alert_fingerprints(alerts)
+    if checkpoint:
+        finished = checkpoint.completed()
+        pending = [i for i, fp in enumerate(fingerprints) if fp not in finished]
+        if len(pending) < len(alerts):
+            print(f"⏩ Resuming: {len(alerts) - len(pending)} alerts already done, "
+                  f"{len(pending)} to run.\n")
+        alerts = [alerts[i] for i in pending]
+        fingerprints = [fingerprints[i] for i in pending]
+
+    if not alerts:
+        return []
+
+    # MITRE for the whole batch in one matrix multiply
+    mitre_batch = match_mitre_batch(alerts)
+
+    # Queue all VT lookups now (deduplicated, highest priority first)
+    prefetch_reputation(alerts, mitre_batch, scheduler=get_resources().vt)
+
+    return run_alerts(alerts, mitre_batch=mitre_batch, concurrency=concurrency, verbose=verbose,
+                      checkpoint=checkpoint, fingerprints=fingerprints)
 
-    for i, alert in enumerate(alerts, start=1):
-        print(f"\n================ ALERT {i} ================\n")
-        result = run_alert(alert)
-        results.append(result)
 
-    return results
+def analyze_input(path: str = ALERTS_FILE, follow: bool = False,
+                  batch_size: int = ANALYZE_BATCH_SIZE, batch_wait: float = ANALYZE_BATCH_WAIT,
+                  concurrency: int = ANALYZE_CONCURRENCY, verbose: bool = False,
+                  checkpoint: RunCheckpoint = None) -> dict:
+    """
+    Streams alerts from `path` through the SOAx Agent without loading
+    the input: analysis starts with the first micro-batch and records
+    go straight to history. Returns counts (received, skipped, done,
+    failed). With follow (or stdin) this runs until the input ends or
+    the process is interrupted.
+    """
+
+    # A finite file gets a cheap counting pass for the ETA
+    total = None if follow or path == "-" else count_alerts(path)
+    if total is not None:
+        print(f"\n📌 Streaming {total} alerts from {path}.\n")
+    else:
+        print(f"\n📌 Streaming alerts from {'stdin' if path == '-' else path}.\n")
+
+    return asyncio.run(analyze_stream(
+        open_source(path, follow=follow),
+        batch_size=batch_size,
+        batch_wait=batch_wait,
+        concurrency=concurrency,
+        checkpoint=checkpoint,
+        total=total,
+        verbose=verbose
+    ))
 
 
 # ------------------------------------------------------------
 # Manual Execution
 # ------------------------------------------------------------
 if __name__ == "__main__":
-    final_results = analyze_all_alerts()
+    parser = argparse.ArgumentParser(description="SOAx batch analyzer")
+    parser.add_argument("--input", default=ALERTS_FILE,
+                        help="alerts file: *.json array or JSONL; '-' reads JSONL from stdin")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep reading a JSONL file as it grows (like tail -f)")
+    parser.add_argument("--batch-size", type=int, default=ANALYZE_BATCH_SIZE,
+                        help="alerts per micro-batch (MITRE + VT prefetch)")
+    parser.add_argument("--batch-wait", type=float, default=ANALYZE_BATCH_WAIT,
+                        help="seconds to wait for a micro-batch to fill")
+    parser.add_argument("--pack", type=int, default=1,
+                        help="alerts per LLM request (packed prompt mode)")
+    parser.add_argument("--concurrency", type=int, default=ANALYZE_CONCURRENCY,
+                        help="alerts in flight at once")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print every alert's full final state")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore the checkpoint and start from alert 1")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="do not record progress")
+    args = parser.parse_args()
+
+    # stdin has no identity across runs: nothing to resume
+    checkpoint = None
+    if not args.no_checkpoint and args.input != "-":
+        checkpoint = RunCheckpoint(run_id=os.path.abspath(args.input))
+        if args.fresh:
+            checkpoint.reset()
+
+    # SIGTERM unwinds like Ctrl+C, so the finally below still drains
+    # the history writer and closes the stores
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    resources = get_resources()
+    try:
+        if args.pack > 1:
+            final_results = analyze_all_alerts(pack_size=args.pack, path=args.input)
+            summary = {"done": len(final_results), "failed": 0}
+        else:
+            summary = analyze_input(args.input, follow=args.follow, batch_size=args.batch_size,
+                                    batch_wait=args.batch_wait, concurrency=args.concurrency,
+                                    verbose=args.verbose, checkpoint=checkpoint)
+            if summary["skipped"]:
+                print(f"⏩ Resumed: {summary['skipped']} alerts were already done.")
 
-    print("\n\n🎉 All alerts processed successfully!")
-    print(f"Total results saved: {len(final_results)}")
+        print("\n\n🎉 All alerts processed!")
+        print(f"Total results saved: {summary['done'] - summary['failed']}/{summary['done']}")
+        print(f"VirusTotal scheduler: {resources.vt.metrics()}")
+        if resources.reuse_index:
+            print(f"Analysis reuse: {resources.reuse_index.stats()}")
+        if checkpoint:
+            print(f"Checkpoint: {checkpoint.stats()}")
+        print(f"History writer: {get_history_writer().stats()}")
+    finally:
+        close_resources()
+        if checkpoint:
+            checkpoint.close()
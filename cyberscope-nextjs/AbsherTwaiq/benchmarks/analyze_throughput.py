@@ -0,0 +1,78 @@
+# ============================================================
+# benchmarks/analyze_throughput.py
+# End-to-end graph throughput: alerts in flight = 1 vs N
+# - VT and LLM are local stubs with fixed latency
+# - MITRE matches are given (no ATT&CK snapshot needed)
+# - History goes to a temp file
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.analyze_throughput --alerts 64 --concurrency 32
+# ============================================================
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.llm_stub import StubLLMServer
+from benchmarks.vt_stub import StubVTServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async batch analyzer benchmark")
+    parser.add_argument("--alerts", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--vt-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.llm_latency) as llm_stub, \
+            StubVTServer(latency=args.vt_latency) as vt_stub, \
+            tempfile.TemporaryDirectory() as tmp:
+
+        # Read at import: endpoint, caches and reuse off so every alert does the full path
+        os.environ.update({
+            "LLM_ENDPOINT_URL": llm_stub.url, "LLM_CACHE": "0", "LLM_STREAM": "0",
+            "ALERT_REUSE": "0", "VT_API_KEY": "stub",
+        })
+        from RAG.virustotal_client import VTClient
+        from RAG.vt_scheduler import VTScheduler
+        from framework.resources import AgentResources
+        from framework.run_agent import run_alerts
+        from storage import history_store
+
+        history_store.HISTORY_PATH = os.path.join(tmp, "history.jsonl")
+        history_store.HISTORY_DB_PATH = os.path.join(tmp, "history.sqlite3")
+
+        def make_resources():
+            client = VTClient(api_key="stub", base_url=vt_stub.base_url, use_cache=False)
+            return AgentResources(vt=VTScheduler(client, requests_per_minute=10**6, workers=32))
+
+        alerts = [
+            {"description": f"Multiple failed logins for account #{i}", "username": f"user{i}",
+             "source_ip": f"185.220.{i // 250}.{i % 250 + 1}", "location": "HQ"}
+            for i in range(args.alerts)
+        ]
+        mitre = [{"id": "T1110", "name": "Brute Force", "tactic": "credential-access",
+                  "confidence": 80}] * len(alerts)
+
+        print(f"{len(alerts)} alerts, LLM {args.llm_latency:.2f}s, VT {args.vt_latency:.2f}s/request")
+        for concurrency in (1, args.concurrency):
+            resources = make_resources()
+            n = len(alerts) if concurrency > 1 else min(len(alerts), 8)
+
+            start = time.perf_counter()
+            results = run_alerts(alerts[:n], mitre_batch=mitre[:n], concurrency=concurrency,
+                                 progress=False, resources=resources)
+            elapsed = time.perf_counter() - start
+
+            ok = sum(r is not None for r in results)
+            print(f"  in flight {concurrency:<3} {n / elapsed:7.2f} alerts/s  ({ok}/{n} ok)")
+            resources.vt.close()
+
+        # Before the temp dir goes: closing also exports history.json there
+        history_store.close_history()
+
+
+if __name__ == "__main__":
+    main()
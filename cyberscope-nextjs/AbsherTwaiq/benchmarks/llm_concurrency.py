@@ -0,0 +1,65 @@
+# ============================================================
+# benchmarks/llm_concurrency.py
+# LLM throughput: serial call_llm vs call_llm_many
+# against a local fake inference endpoint with fixed latency,
+# or end to end on the local CPU model (--backend local)
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.llm_concurrency --prompts 32 --latency 1.0 --concurrency 8
+#   python -m benchmarks.llm_concurrency --backend local --prompts 8
+# ============================================================
+
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+
+from benchmarks.llm_stub import StubLLMServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM concurrency benchmark")
+    parser.add_argument("--prompts", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds per generation")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--backend", choices=["remote", "local"], default="remote",
+                        help="remote = stub endpoint, local = transformers on CPU")
+    args = parser.parse_args()
+
+    local = args.backend == "local"
+    with (contextlib.nullcontext() if local else StubLLMServer(latency=args.latency)) as stub:
+        # LLM reads its backend at import; cache off so every call generates
+        os.environ["LLM_BACKEND"] = args.backend
+        if not local:
+            os.environ["LLM_ENDPOINT_URL"] = stub.url
+        os.environ["LLM_CACHE"] = "0"
+        import LLM
+
+        if local:
+            start = time.perf_counter()
+            LLM.get_backend()
+            print(f"model load {time.perf_counter() - start:.1f}s ({LLM.cache_model()})")
+
+        prompts = [f"Analyze alert #{i}" for i in range(args.prompts)]
+        serial_n = min(len(prompts), max(args.concurrency, 4))
+
+        start = time.perf_counter()
+        for p in prompts[:serial_n]:
+            LLM.call_llm(p)
+        serial = (time.perf_counter() - start) / serial_n
+
+        start = time.perf_counter()
+        outputs = asyncio.run(LLM.call_llm_many(prompts, concurrency=args.concurrency))
+        batch = time.perf_counter() - start
+
+        ok = sum(not o.startswith("[") for o in outputs)
+        print(f"{len(prompts)} prompts, " +
+              (args.backend if local else f"stub latency {args.latency:.2f}s"))
+        print(f"  serial    {1 / serial:8.2f} alerts/s  ({serial:.2f}s each, {serial_n} timed)")
+        print(f"  many(c={args.concurrency:<2}) {len(prompts) / batch:8.2f} alerts/s  "
+              f"({batch:.2f}s total, {ok}/{len(prompts)} ok)")
+
+
+if __name__ == "__main__":
+    main()
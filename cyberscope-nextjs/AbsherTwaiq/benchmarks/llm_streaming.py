@@ -0,0 +1,61 @@
+# ============================================================
+# benchmarks/llm_streaming.py
+# Per-alert latency and tokens: call_llm (runs to max_new_tokens)
+# vs stream_llm (cancels once all 6 fields are parsed)
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.llm_streaming --prompts 5 --token-latency 0.01
+# ============================================================
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.llm_stub import StubLLMServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM streaming early-stop benchmark")
+    parser.add_argument("--prompts", type=int, default=5)
+    parser.add_argument("--token-latency", type=float, default=0.01, help="stub seconds per token")
+    args = parser.parse_args()
+
+    with StubLLMServer(token_latency=args.token_latency) as stub:
+        os.environ["LLM_ENDPOINT_URL"] = stub.url
+        os.environ["LLM_CACHE"] = "0"
+        import LLM
+
+        prompts = [f"Analyze alert #{i}" for i in range(args.prompts)]
+        max_tokens = LLM.GENERATION_PARAMS["max_new_tokens"]
+        print(f"{len(prompts)} prompts, {args.token_latency * 1000:.0f} ms/token, "
+              f"max_new_tokens={max_tokens}")
+
+        # Baseline: same stream, consumed to the end (what call_llm waits for)
+        start = time.perf_counter()
+        sent = stub.tokens_sent
+        for p in prompts:
+            for _ in LLM.get_backend().stream(p, LLM.GENERATION_PARAMS):
+                pass
+        full = (time.perf_counter() - start) / len(prompts)
+        full_tokens = (stub.tokens_sent - sent) / len(prompts)
+        print(f"  full      {full:6.2f} s/alert  {full_tokens:6.0f} tokens/alert")
+
+        start = time.perf_counter()
+        sent = stub.tokens_sent
+        first = []
+        for p in prompts:
+            _, metrics = LLM.stream_llm(p)
+            first.append(metrics["time_to_first_field_s"])
+        early = (time.perf_counter() - start) / len(prompts)
+        time.sleep(0.2)  # let the stub notice the closed sockets
+        early_tokens = (stub.tokens_sent - sent) / len(prompts)
+        print(f"  early     {early:6.2f} s/alert  {early_tokens:6.0f} tokens/alert  "
+              f"first field {sum(first) / len(first):.3f}s")
+
+        raw, metrics = asyncio.run(LLM.astream_llm(prompts[0]))
+        print(f"  async     stopped_early={metrics['stopped_early']}  chunks={metrics['chunks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# ============================================================
+# benchmarks/llm_stub.py
+# Local fake TGI-compatible inference endpoint
+# - POST / {"inputs": ..., "parameters": ...}
+# - Fixed artificial latency per generation
+# - Replies with a well-formed 6-field SOC analysis
+# - "stream": true → server-sent events, one token per word
+#   (token_latency each), then trailing filler up to max_new_tokens
+# ============================================================
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SAMPLE_ANALYSIS = (
+    "Risk Score: 7\n"
+    "MITRE ATT&CK Technique: T1110 - Brute Force\n"
+    "Behavioral Pattern: Repeated failed logins followed by success.\n"
+    "Evidence Needed: Authentication logs, source IP history.\n"
+    "IR Action: Reset credentials and block the source IP.\n"
+    "AI Recommendation: Escalate - likely credential compromise."
+)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class StubLLMServer:
+
+    def __init__(self, latency: float = 1.0, text: str = SAMPLE_ANALYSIS,
+                 token_latency: float = 0.02):
+        self.latency = latency
+        self.text = text
+        self.token_latency = token_latency
+        self.requests = 0
+        self.tokens_sent = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+
+                if body.get("stream"):
+                    self.stream(body.get("parameters", {}).get("max_new_tokens", 300))
+                    return
+
+                time.sleep(stub.latency)
+
+                payload = json.dumps([{"generated_text": stub.text}]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def stream(self, max_new_tokens: int):
+                tokens = (stub.text + "\n").replace("\n", " \n").split(" ")
+                tokens = [t + " " if not t.endswith("\n") else t for t in tokens]
+                # A real model keeps going until max_new_tokens
+                tokens += [" filler"] * max(0, max_new_tokens - len(tokens))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                try:
+                    for i, text in enumerate(tokens):
+                        time.sleep(stub.token_latency)
+                        event = {"token": {"id": i, "text": text, "logprob": 0.0, "special": False},
+                                 "generated_text": None, "details": None}
+                        self.wfile.write(f"data:{json.dumps(event)}\n\n".encode())
+                        self.wfile.flush()
+                        with stub._lock:
+                            stub.tokens_sent += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client cancelled
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
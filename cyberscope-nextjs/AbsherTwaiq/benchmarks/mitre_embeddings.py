@@ -0,0 +1,73 @@
+# ============================================================
+# benchmarks/mitre_embeddings.py
+# MITRE matcher benchmark: TF-IDF index vs local embeddings
+# - Throughput (batched) on alert.json
+# - Top-1 agreement between the two matchers
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.mitre_embeddings --repeat 100
+# ============================================================
+
+import argparse
+import json
+import time
+
+from RAG import mitre_client
+
+
+ALERTS_FILE = "alert.json"
+
+
+def load_descriptions() -> list[str]:
+    with open(ALERTS_FILE, "r", encoding="utf-8") as f:
+        return [a.get("description", "") for a in json.load(f)]
+
+
+def top1_ids(matcher: str, descriptions: list[str]) -> list[str]:
+    ranked = mitre_client.search_attack_techniques(descriptions, k=1, matcher=matcher)
+    return [row[0]["id"] for row in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TF-IDF vs embedding MITRE matcher")
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="replicate alert.json to get a stable throughput figure")
+    args = parser.parse_args()
+
+    descriptions = load_descriptions()
+    workload = [d.lower() for d in descriptions * args.repeat]
+    results = {}
+
+    for matcher in mitre_client.MATCHERS:
+        start = time.perf_counter()
+        try:
+            index = mitre_client.get_technique_index(matcher)
+        except ImportError as e:
+            print(f"{matcher:<10} skipped: optional dependency missing ({e})")
+            continue
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index.top_k(workload, k=1)
+        elapsed = time.perf_counter() - start
+
+        results[matcher] = top1_ids(matcher, descriptions)
+        print(
+            f"{matcher:<10} load/build {build:7.2f}s   "
+            f"{len(workload) / elapsed:10.1f} alerts/s   "
+            f"({elapsed / len(workload) * 1000:.3f} ms/alert)"
+        )
+
+    if len(results) < 2:
+        return
+
+    print("\nalert.json top-1:")
+    agree = 0
+    for desc, a, b in zip(descriptions, results["tfidf"], results["embedding"]):
+        agree += a == b
+        print(f"  {a:<10} {b:<10} {desc[:60]}")
+    print(f"\nTop-1 agreement: {agree}/{len(descriptions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# ============================================================
+# benchmarks/mitre_matching.py
+# MITRE matcher benchmark: legacy difflib scan vs TF-IDF index
+# (per-alert and batched top-k)
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.mitre_matching
+#   python -m benchmarks.mitre_matching --synthetic 100000 --difflib-sample 200
+# ============================================================
+
+import argparse
+import json
+import random
+import time
+
+from RAG import mitre_client
+
+
+ALERTS_FILE = "alert.json"
+
+NOISE_WORDS = [
+    "server", "endpoint", "user", "account", "host", "process", "remote",
+    "network", "session", "admin", "service", "file", "registry", "domain",
+    "credential", "connection", "workstation", "payload", "script", "token"
+]
+
+
+def load_descriptions() -> list[str]:
+    with open(ALERTS_FILE, "r", encoding="utf-8") as f:
+        return [a.get("description", "") for a in json.load(f)]
+
+
+def synthetic_descriptions(base: list[str], count: int, seed: int = 7) -> list[str]:
+    """Mutates real alert descriptions with noise words and IPs."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        words = rng.choice(base).split()
+        for _ in range(rng.randint(1, 4)):
+            words.insert(rng.randint(0, len(words)), rng.choice(NOISE_WORDS))
+        ip = ".".join(str(rng.randint(1, 254)) for _ in range(4))
+        out.append(" ".join(words) + f" from {ip}")
+    return out
+
+
+# ------------------------------------------------------------
+# Matchers under test (matching step only, no enrichment)
+# ------------------------------------------------------------
+def difflib_best(keyword: str):
+    keyword = keyword.lower()
+    best, best_score = None, 0.0
+    for t in mitre_client.get_techniques():
+        score = mitre_client.compute_similarity(keyword, t)
+        if score > best_score:
+            best, best_score = t, score
+    return best
+
+
+def index_best(keyword: str):
+    return mitre_client.get_technique_index().best_match(keyword.lower())[0]
+
+
+def batch_best(keywords: list[str]) -> list:
+    ranked = mitre_client.get_technique_index().top_k([k.lower() for k in keywords], k=1)
+    return [row[0][0] for row in ranked]
+
+
+def technique_id(t) -> str:
+    if not t:
+        return "N/A"
+    return t.get("external_references", [{}])[0].get("external_id", "N/A")
+
+
+def timed(fn, items: list[str]):
+    start = time.perf_counter()
+    results = [technique_id(fn(x)) for x in items]
+    return results, time.perf_counter() - start
+
+
+def timed_batch(items: list[str]):
+    start = time.perf_counter()
+    results = [technique_id(t) for t in batch_best(items)]
+    return results, time.perf_counter() - start
+
+
+def report(label: str, n: int, seconds: float, extrapolated_to: int = None):
+    per = seconds / n * 1000 if n else 0.0
+    line = f"  {label:<10} {n:>7} alerts  {seconds:9.3f}s  {per:8.3f} ms/alert"
+    if extrapolated_to:
+        line += f"  (~{per * extrapolated_to / 1000:,.0f}s for {extrapolated_to:,})"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MITRE matcher benchmark")
+    parser.add_argument("--synthetic", type=int, default=100_000)
+    parser.add_argument("--difflib-sample", type=int, default=200,
+                        help="difflib is too slow for the full synthetic set; "
+                             "time a sample and extrapolate")
+    args = parser.parse_args()
+
+    print(f"Techniques in corpus: {len(mitre_client.get_techniques())}")
+
+    start = time.perf_counter()
+    mitre_client.get_technique_index()
+    print(f"Index build: {time.perf_counter() - start:.3f}s\n")
+
+    # --- alert.json ---
+    descriptions = load_descriptions()
+    print(f"alert.json ({len(descriptions)} alerts)")
+    legacy, t_legacy = timed(difflib_best, descriptions)
+    indexed, t_index = timed(index_best, descriptions)
+    _, t_batch = timed_batch(descriptions)
+    report("difflib", len(descriptions), t_legacy)
+    report("tfidf", len(descriptions), t_index)
+    report("batch", len(descriptions), t_batch)
+    agree = sum(a == b for a, b in zip(legacy, indexed))
+    print(f"  top-1 agreement with difflib: {agree}/{len(descriptions)}\n")
+
+    # --- synthetic ---
+    synthetic = synthetic_descriptions(descriptions, args.synthetic)
+    print(f"synthetic ({len(synthetic):,} alerts)")
+    sample = synthetic[:args.difflib_sample]
+    _, t_legacy = timed(difflib_best, sample)
+    _, t_index = timed(index_best, synthetic)
+    _, t_batch = timed_batch(synthetic)
+    report("difflib", len(sample), t_legacy, extrapolated_to=len(synthetic))
+    report("tfidf", len(synthetic), t_index)
+    report("batch", len(synthetic), t_batch)
+
+
+if __name__ == "__main__":
+    main()
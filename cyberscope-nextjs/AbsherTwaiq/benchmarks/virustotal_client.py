@@ -0,0 +1,79 @@
+# ============================================================
+# benchmarks/virustotal_client.py
+# VirusTotal client benchmark against a local stub server
+# - legacy:  module-level requests.get, two serial calls per IP
+# - pooled:  VTClient.scan_ip over a keep-alive session
+# - async:   VTClient.scan_ips_async (bounded concurrency)
+# - cached:  repeat lookups served by VTReputationCache
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.virustotal_client --ips 200 --latency 0.1
+# ============================================================
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import requests
+
+from RAG.virustotal_client import VTClient, VTReputationCache
+from benchmarks.vt_stub import StubVTServer
+
+
+def legacy_scan(base_url: str, ip: str):
+    """The pre-pool request pattern: fresh connection, serial calls."""
+    headers = {"x-apikey": "stub"}
+    requests.get(f"{base_url}/ip_addresses/{ip}", headers=headers).json()
+    requests.get(f"{base_url}/ip_addresses/{ip}/comments", headers=headers).json()
+
+
+def report(label: str, n: int, seconds: float):
+    print(f"  {label:<8} {seconds / n * 1000:9.2f} ms/IP   {n / seconds:9.1f} IPs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VirusTotal client benchmark")
+    parser.add_argument("--ips", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub seconds per request")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    ips = [f"185.220.{i // 250}.{i % 250 + 1}" for i in range(args.ips)]
+
+    with StubVTServer(latency=args.latency) as stub:
+        client = VTClient(api_key="stub", base_url=stub.base_url, use_cache=False)
+        print(f"{len(ips)} IPs, stub latency {args.latency * 1000:.0f} ms/request\n")
+
+        start = time.perf_counter()
+        for ip in ips:
+            legacy_scan(stub.base_url, ip)
+        report("legacy", len(ips), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for ip in ips:
+            client.scan_ip(ip)
+        report("pooled", len(ips), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        asyncio.run(client.scan_ips_async(ips, concurrency=args.concurrency))
+        report("async", len(ips), time.perf_counter() - start)
+
+        client.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = VTReputationCache(os.path.join(tmp, "vt_cache.sqlite3"))
+            cached = VTClient(api_key="stub", base_url=stub.base_url, cache=cache)
+            cached.scan_ips(ips, concurrency=args.concurrency)  # warm
+
+            start = time.perf_counter()
+            for ip in ips:
+                cached.scan_ip(ip)
+            elapsed = time.perf_counter() - start
+            print(f"  {'cached':<8} {elapsed / len(ips) * 1e6:9.1f} us/IP   {cache.stats()}")
+            cached.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# ============================================================
+# benchmarks/vt_scheduler.py
+# VirusTotal scheduler benchmark against a local stub server
+# - Burst of alerts sharing a small pool of source IPs
+# - Reports VT calls saved and queue wait time
+#
+# Usage (from AbsherTwaiq/):
+#   python -m benchmarks.vt_scheduler --alerts 500 --unique-ips 40 --rpm 1200
+# ============================================================
+
+import argparse
+import random
+import time
+
+from RAG.virustotal_client import VTClient
+from RAG.vt_scheduler import VTScheduler
+from benchmarks.vt_stub import StubVTServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VirusTotal scheduler benchmark")
+    parser.add_argument("--alerts", type=int, default=500)
+    parser.add_argument("--unique-ips", type=int, default=40)
+    parser.add_argument("--private-share", type=float, default=0.6,
+                        help="fraction of alerts from RFC1918 sources")
+    parser.add_argument("--rpm", type=int, default=1200, help="stub account quota")
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    public = [f"185.220.{i // 250}.{i % 250 + 1}" for i in range(args.unique_ips)]
+    alerts = [
+        (f"10.0.{rng.randint(0, 9)}.{rng.randint(1, 254)}" if rng.random() < args.private_share
+         else rng.choice(public), rng.randint(0, 100))
+        for _ in range(args.alerts)
+    ]
+
+    with StubVTServer(latency=args.latency) as stub:
+        client = VTClient(api_key="stub", base_url=stub.base_url, use_cache=False)
+        scheduler = VTScheduler(client, requests_per_minute=args.rpm)
+
+        start = time.perf_counter()
+        futures = [scheduler.submit(ip, priority) for ip, priority in alerts]
+        for f in futures:
+            f.result()
+        elapsed = time.perf_counter() - start
+
+        print(f"{args.alerts} alerts, {args.unique_ips} public IPs, quota {args.rpm} req/min")
+        print(f"  wall time: {elapsed:.2f}s   stub requests: {stub.requests}")
+        for key, value in scheduler.metrics().items():
+            print(f"  {key:<18} {value:.3f}" if isinstance(value, float) else f"  {key:<18} {value}")
+
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
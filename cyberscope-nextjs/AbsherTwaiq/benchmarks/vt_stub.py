@@ -0,0 +1,80 @@
+# ============================================================
+# benchmarks/vt_stub.py
+# Local stub of the VirusTotal v3 IP endpoints
+# - /ip_addresses/<ip> and /ip_addresses/<ip>/comments
+# - Fixed artificial latency per request (simulates WAN RTT)
+# - Counts requests served
+# ============================================================
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def ip_report(ip: str) -> dict:
+    return {
+        "data": {
+            "attributes": {
+                "last_analysis_stats": {"malicious": 2, "suspicious": 1, "harmless": 60, "undetected": 30},
+                "total_votes": {"harmless": 3, "malicious": 1},
+                "asn": 64500,
+                "as_owner": "Stub Networks",
+                "country": "SA",
+                "network": f"{ip.rsplit('.', 1)[0]}.0/24",
+                "last_analysis_date": 1733232292,
+                "whois": "NetName: STUB\nCountry: SA\nAddress: 1 Stub Road",
+            }
+        }
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # default of 5 drops concurrent connects
+
+
+class StubVTServer:
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.latency)
+
+                parts = self.path.strip("/").split("/")
+                if parts[-1] == "comments":
+                    body = {"meta": {"count": 4}, "data": []}
+                else:
+                    body = ip_report(parts[-1])
+
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -74,13 +74,27 @@ class LLMResponseSchema(TypedDict):
 
 
 # -------------------------------
-# 5) FINAL History Record Schema
+# 5) Reuse Provenance
+# (set when llm_response was copied from a
+#  near-duplicate past record, not generated)
+# -------------------------------
+class ProvenanceSchema(TypedDict):
+    source: str                   # "history"
+    fingerprint: str
+    matched_fingerprint: str
+    similarity: float             # 1.0 = identical fingerprint
+    matched_alert: AlertSchema
+
+
+# -------------------------------
+# 6) FINAL History Record Schema
 # -------------------------------
 class HistoryRecord(TypedDict):
     alert: AlertSchema
     mitre: MitreSchema
     virustotal: VirusTotalSchema
     llm_response: LLMResponseSchema
+    provenance: Optional[ProvenanceSchema]   # only on reused records
 
 
 # -------------------------------
@@ -91,5 +105,6 @@ __all__ = [
     "MitreSchema",
     "VirusTotalSchema",
     "LLMResponseSchema",
+    "ProvenanceSchema",
     "HistoryRecord"
 ]
@@ -0,0 +1,291 @@
+# ============================================================
+# framework/alert_stream.py
+# Streaming alert ingestion for SOAx
+# - Sources: JSONL file, JSON array file (parsed incrementally),
+#   tailed JSONL file (--follow), stdin ("-")
+# - Micro-batches by size or time window
+# - Bounded buffers end to end (backpressure): memory stays flat,
+#   first results appear while input is still arriving
+# ============================================================
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import CancelledError
+from typing import AsyncIterator, Iterator, TextIO
+
+from RAG.rag_engine import match_mitre_batch, prefetch_reputation
+from framework.resources import AgentResources, get_resources
+from framework.run_agent import ANALYZE_CONCURRENCY, AlertPipeline
+from storage.run_checkpoint import RunCheckpoint, alert_fingerprints
+from framework.SOAx_data_schema import AlertSchema
+
+# Alerts per micro-batch (one MITRE matrix multiply + VT prefetch each)
+ANALYZE_BATCH_SIZE = int(os.getenv("ANALYZE_BATCH_SIZE", 64))
+# Seconds to wait for a batch to fill before sending it anyway
+ANALYZE_BATCH_WAIT = float(os.getenv("ANALYZE_BATCH_WAIT", 2.0))
+
+TAIL_POLL_INTERVAL = 0.5
+READ_CHUNK_SIZE = 64 * 1024
+
+
+# ------------------------------------------------------------
+# Sources (plain iterators, one alert at a time)
+# ------------------------------------------------------------
+def iter_jsonl(stream: TextIO, name: str = "<stdin>") -> Iterator[AlertSchema]:
+    for lineno, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ {name}:{lineno} skipped: {e}")
+
+
+def iter_json_array(stream: TextIO) -> Iterator[AlertSchema]:
+    """Yields the objects of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    opened = False
+    eof = False
+
+    while True:
+        # Skip whitespace and separators
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+
+        if pos < len(buffer):
+            if not opened:
+                if buffer[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                alert, end = decoder.raw_decode(buffer, pos)
+                yield alert
+                pos = end
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+
+        elif eof:
+            if opened:
+                raise ValueError("unterminated JSON array")
+            return
+
+        # Need more input: keep only the unparsed tail
+        chunk = stream.read(READ_CHUNK_SIZE)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        eof = not chunk
+
+
+def tail_jsonl(path: str, poll_interval: float = TAIL_POLL_INTERVAL) -> Iterator[AlertSchema]:
+    """
+    Follows a JSONL file like `tail -f` (from its start), forever.
+    A half-written last line waits for its newline; a truncated
+    (rotated) file is read again from the top.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        partial = ""
+        while True:
+            line = f.readline()
+            if not line:
+                if os.path.getsize(path) < f.tell():
+                    f.seek(0)
+                    partial = ""
+                time.sleep(poll_interval)
+                continue
+
+            partial += line
+            if not partial.endswith("\n"):
+                continue
+
+            text, partial = partial.strip(), ""
+            if not text:
+                continue
+            try:
+                yield json.loads(text)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ {path}: line skipped: {e}")
+
+
+def open_source(path: str, follow: bool = False) -> Iterator[AlertSchema]:
+    """
+    "-" → JSONL on stdin; follow → tailed JSONL file;
+    *.json → JSON array (streamed); anything else → JSONL.
+    """
+    if path == "-":
+        yield from iter_jsonl(sys.stdin)
+        return
+
+    if follow:
+        yield from tail_jsonl(path)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            yield from iter_json_array(f)
+        else:
+            yield from iter_jsonl(f, name=path)
+
+
+def count_alerts(path: str) -> int:
+    """One cheap pass over a finite file, for progress ETA."""
+    return sum(1 for _ in open_source(path))
+
+
+# ------------------------------------------------------------
+# Micro-batching with backpressure
+# ------------------------------------------------------------
+async def micro_batches(
+    source: Iterator[AlertSchema],
+    max_size: int = ANALYZE_BATCH_SIZE,
+    max_wait: float = ANALYZE_BATCH_WAIT
+) -> AsyncIterator[list[AlertSchema]]:
+    """
+    Reads `source` on a background thread into a bounded queue and
+    yields a batch once it holds max_size alerts or max_wait seconds
+    have passed since its first alert. While the consumer is busy the
+    queue fills and the reader thread blocks: nothing is read ahead
+    beyond two batches.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=2 * max_size)
+    end = object()
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # False once the consumer is gone (loop closed or put cancelled)
+        if stopped.is_set():
+            return False
+        put_item = queue.put(item)
+        try:
+            asyncio.run_coroutine_threadsafe(put_item, loop).result()
+            return True
+        except RuntimeError:
+            put_item.close()
+            return False
+        except CancelledError:
+            return False
+
+    def pump():
+        try:
+            for alert in source:
+                if not put(alert):
+                    return
+            item = end
+        except Exception as e:
+            item = e
+        put(item)
+
+    # Daemon: a tailed file or stdin may never end
+    threading.Thread(target=pump, name="alert-reader", daemon=True).start()
+
+    try:
+        async for batch in _collect(queue, end, max_size, max_wait):
+            yield batch
+    finally:
+        stopped.set()
+
+
+async def _collect(queue: asyncio.Queue, end: object, max_size: int,
+                   max_wait: float) -> AsyncIterator[list[AlertSchema]]:
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is end:
+            return
+        if isinstance(item, Exception):
+            raise item
+
+        batch = [item]
+        deadline = loop.time() + max_wait
+
+        while len(batch) < max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+            if item is end or isinstance(item, Exception):
+                yield batch
+                if isinstance(item, Exception):
+                    raise item
+                return
+            batch.append(item)
+
+        yield batch
+
+
+# ------------------------------------------------------------
+# Streaming analysis
+# ------------------------------------------------------------
+async def analyze_stream(
+    source: Iterator[AlertSchema],
+    batch_size: int = ANALYZE_BATCH_SIZE,
+    batch_wait: float = ANALYZE_BATCH_WAIT,
+    concurrency: int = ANALYZE_CONCURRENCY,
+    checkpoint: RunCheckpoint = None,
+    total: int = None,
+    progress: bool = True,
+    verbose: bool = False,
+    resources: AgentResources = None
+) -> dict:
+    """
+    Pulls micro-batches from `source`, scores MITRE and queues VT for
+    each batch, then feeds its alerts into an AlertPipeline. When the
+    pipeline is full, submit() waits, batching pauses and the reader
+    stops: results are written to history, not kept in memory.
+
+    checkpoint: alerts it records as done are skipped before any
+    MITRE, VT or LLM work; failed ones run again.
+    """
+    resources = resources or get_resources()
+    finished = checkpoint.completed() if checkpoint else set()
+    if total is not None:
+        total = max(total - len(finished), 0)
+
+    seen = {}
+    received = skipped = 0
+
+    async with AlertPipeline(concurrency=concurrency, resources=resources, checkpoint=checkpoint,
+                             total=total, progress=progress, verbose=verbose) as pipeline:
+
+        async for batch in micro_batches(source, batch_size, batch_wait):
+            fingerprints = alert_fingerprints(batch, seen)
+            todo = [
+                (received + i, alert, fp)
+                for i, (alert, fp) in enumerate(zip(batch, fingerprints))
+                if fp not in finished
+            ]
+            skipped += len(batch) - len(todo)
+            received += len(batch)
+            if not todo:
+                continue
+
+            alerts = [alert for _, alert, _ in todo]
+            mitre_batch = await asyncio.to_thread(match_mitre_batch, alerts)
+            await asyncio.to_thread(prefetch_reputation, alerts, mitre_batch, resources.vt)
+
+            for (index, alert, fp), mitre in zip(todo, mitre_batch):
+                await pipeline.submit(index, alert, mitre, fp)
+
+    return {
+        "received": received,
+        "skipped": skipped,
+        "done": pipeline.done,
+        "failed": pipeline.failed,
+    }
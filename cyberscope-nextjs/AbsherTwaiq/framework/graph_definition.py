@@ -2,15 +2,21 @@
 # framework/graph_definition.py
 # SOAx Agent Graph Pipeline (MITRE + VT + LLM + History)
 # Now fully compatible with SOAx_data_schema.py
+# Near-duplicates of past alerts skip the LLM (reuse gate)
+# Nodes get their clients from an injected AgentResources
 # =======================================================
 
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from typing import TypedDict, Optional
+from functools import lru_cache, partial
 
-from RAG.rag_engine import ThreatRAG
+from RAG.rag_engine import alert_priority
 from prompt_builder import build_prompt
-from LLM import call_llm
+from LLM import LLM_STREAM, call_llm, acall_llm, stream_llm, astream_llm
+from prompt_generator import parse_llm_response
 from storage.history_store import save_to_history
+from framework.resources import AgentResources, get_resources
 
 from framework.SOAx_data_schema import (
     AlertSchema,
@@ -30,64 +36,46 @@ class AlertState(TypedDict):
     virustotal: Optional[VirusTotalSchema]
     prompt: Optional[str]
     llm_response: Optional[LLMResponseSchema]
+    llm_metrics: Optional[dict]
+    provenance: Optional[dict]
 
 
 # -------------------------------
-# Node 1: RAG Enrichment
+# Node 1: RAG Enrichment (fan-out)
+# MITRE (CPU) and VirusTotal (network) run as parallel
+# branches; each returns only its own key, and both join
+# before the reuse gate, so the step costs max(), not sum()
 # -------------------------------
-def enrich_rag(state: AlertState) -> AlertState:
-    rag = ThreatRAG()
-    enriched = rag.enrich_alert(state["alert"])
-
-    full_mitre = enriched["mitre"]
-    full_vt = enriched["virustotal"]
-
-    # -------------------------------
-    # Prepare MITRE data for AI + UI
-    # -------------------------------
-    mitre: MitreSchema = {
-        "id": full_mitre.get("id"),
-        "name": full_mitre.get("name"),
-        "tactic": full_mitre.get("tactic"),
-        "confidence": full_mitre.get("confidence"),
-
-        # UI-only fields
-        "description": full_mitre.get("description"),
-        "mitigations": full_mitre.get("mitigations", []),
-        "detection": full_mitre.get("detection", []),
-        "references": full_mitre.get("references", []),
-    }
-
-    # -------------------------------
-    # Prepare VirusTotal data for AI + UI
-    # -------------------------------
-    vt: VirusTotalSchema = {
-        # AI Use
-        "malicious": full_vt.get("malicious"),
-        "suspicious": full_vt.get("suspicious"),
-        "clean": full_vt.get("clean"),
-        "community_score": full_vt.get("community_score"),
-        "malicious_vendors_count": full_vt.get("malicious_vendors_count"),
-
-        # UI-Only
-        "ip_address": full_vt.get("ip_address"),
-        "asn": full_vt.get("asn"),
-        "organization": full_vt.get("organization"),
-        "country": full_vt.get("country"),
-        "ip_range": full_vt.get("ip_range"),
-        "last_analysis_date": full_vt.get("last_analysis_date"),
-        "community_feeds": full_vt.get("community_feeds"),
-        "voting_details": full_vt.get("voting_details"),
-        "comments_count": full_vt.get("comments_count"),
-        "whois": full_vt.get("whois"),
-    }
-
-    state["mitre"] = mitre
-    state["virustotal"] = vt
+def enrich_mitre(state: AlertState, resources: AgentResources) -> dict:
+    # MITRE may already be set by a batch pre-pass (analyze.py)
+    return {"mitre": resources.rag.enrich_mitre(state["alert"], mitre_raw=state.get("mitre"))}
+
+
+def enrich_virustotal(state: AlertState, resources: AgentResources) -> dict:
+    # Quota priority from a precomputed MITRE match, if any
+    priority = alert_priority(state.get("mitre"))
+    return {"virustotal": resources.rag.enrich_virustotal(state["alert"], priority=priority)}
+
+
+# -------------------------------
+# Node 1b: Reuse Gate
+# -------------------------------
+def reuse_gate(state: AlertState, resources: AgentResources) -> AlertState:
+    index = resources.reuse_index
+    match = index and index.lookup(state["alert"], state["mitre"], state["virustotal"])
+
+    if match:
+        record, provenance = match
+        state["llm_response"] = dict(record["llm_response"])
+        state["provenance"] = provenance
 
     return state
 
 
+def route_after_gate(state: AlertState) -> str:
+    return "save_history" if state.get("provenance") else "build_prompt"
+
+
 # -------------------------------
 # Node 2: Build SOC Prompt
 # -------------------------------
@@ -104,15 +92,28 @@ def build_prompt_node(state: AlertState) -> AlertState:
 # Node 3: LLM Execution
 # -------------------------------
 def llm_node(state: AlertState) -> AlertState:
-    raw = call_llm(state["prompt"])
-
-    from prompt_generator import parse_llm_response
-
-    raw = call_llm(state["prompt"])
+    if LLM_STREAM:
+        # Stops generating once all 6 fields are parsed
+        raw, state["llm_metrics"] = stream_llm(state["prompt"])
+    else:
+        raw = call_llm(state["prompt"])
     parsed = parse_llm_response(raw)
+
     state["llm_response"] = parsed
+    return state
 
 
+# Async variant used by graph.ainvoke (many generations in flight).
+# A batch runner may share one backend session (connection pool)
+# across alerts via config["configurable"]["llm_session"].
+async def allm_node(state: AlertState, config: RunnableConfig) -> AlertState:
+    session = config.get("configurable", {}).get("llm_session")
+    if LLM_STREAM:
+        raw, state["llm_metrics"] = await astream_llm(state["prompt"], session=session)
+    else:
+        raw = await acall_llm(state["prompt"], session=session)
+    parsed = parse_llm_response(raw)
+
     state["llm_response"] = parsed
     return state
 
@@ -129,33 +130,60 @@ def extract_value(label: str, text: str) -> str:
 # -------------------------------
 # Node 4: Save to History
 # -------------------------------
-def save_history_node(state: AlertState) -> AlertState:
+def save_history_node(state: AlertState, resources: AgentResources) -> AlertState:
 
-    save_to_history(
+    record = save_to_history(
         alert=state["alert"],
         mitre=state["mitre"],
         virustotal=state["virustotal"],
-        llm_response=state["llm_response"]
+        llm_response=state["llm_response"],
+        provenance=state.get("provenance")
     )
 
+    # Fresh analyses become reuse candidates for the rest of the run
+    index = resources.reuse_index
+    if index and not state.get("provenance"):
+        index.add(record)
+
     return state
 
 
 # -------------------------------
 # Build the Graph
 # -------------------------------
-graph_builder = StateGraph(AlertState)
+def build_graph(resources: AgentResources):
+    """Compiles the agent graph with its nodes bound to `resources`."""
+
+    graph_builder = StateGraph(AlertState)
+
+    graph_builder.add_node("enrich_mitre", partial(enrich_mitre, resources=resources))
+    graph_builder.add_node("enrich_virustotal", partial(enrich_virustotal, resources=resources))
+    graph_builder.add_node("reuse_gate", partial(reuse_gate, resources=resources))
+    graph_builder.add_node("build_prompt", build_prompt_node)
+    graph_builder.add_node("llm_call", RunnableLambda(llm_node, afunc=allm_node))
+    graph_builder.add_node("save_history", partial(save_history_node, resources=resources))
+
+    # Fan-out from START, fan-in (wait for both) at the reuse gate
+    graph_builder.add_edge(START, "enrich_mitre")
+    graph_builder.add_edge(START, "enrich_virustotal")
+    graph_builder.add_edge(["enrich_mitre", "enrich_virustotal"], "reuse_gate")
+    graph_builder.add_conditional_edges(
+        "reuse_gate",
+        route_after_gate,
+        {"build_prompt": "build_prompt", "save_history": "save_history"}
+    )
+    graph_builder.add_edge("build_prompt", "llm_call")
+    graph_builder.add_edge("llm_call", "save_history")
+    graph_builder.add_edge("save_history", END)
+
+    return graph_builder.compile()
 
-graph_builder.add_node("enrich_rag", enrich_rag)
-graph_builder.add_node("build_prompt", build_prompt_node)
-graph_builder.add_node("llm_call", llm_node)
-graph_builder.add_node("save_history", save_history_node)
 
-graph_builder.set_entry_point("enrich_rag")
+@lru_cache(maxsize=1)
+def _compiled_graph(resources: AgentResources):
+    return build_graph(resources)
 
-graph_builder.add_edge("enrich_rag", "build_prompt")
-graph_builder.add_edge("build_prompt", "llm_call")
-graph_builder.add_edge("llm_call", "save_history")
-graph_builder.add_edge("save_history", END)
 
-graph = graph_builder.compile()
+def get_graph(resources: AgentResources = None):
+    """Graph compiled once per resources container (process-wide by default)."""
+    return _compiled_graph(resources or get_resources())
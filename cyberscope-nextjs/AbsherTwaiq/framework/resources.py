@@ -0,0 +1,107 @@
+# ============================================================
+# framework/resources.py
+# Process-level resources for the SOAx Agent
+# - Built once: VT client + scheduler (HTTP pool, reputation
+#   cache), ThreatRAG, MITRE index, LLM backend + response
+#   cache, reuse index, L3 models
+# - Injected into the graph nodes (see graph_definition.build_graph)
+# - close() releases pools, workers, SQLite handles and the
+#   history log
+# ============================================================
+
+import atexit
+import threading
+from functools import lru_cache
+
+from RAG.rag_engine import ThreatRAG
+from RAG.mitre_client import get_technique_index
+from RAG.vt_scheduler import VTScheduler, get_scheduler
+from LLM import get_response_cache
+from llm_backends import LLMBackend, get_backend
+from storage.reuse_index import get_reuse_index
+from storage.history_store import close_history
+
+
+class AgentResources:
+    """
+    Owns every long-lived object the pipeline needs, so a graph run
+    allocates nothing but its own state. Defaults are the process-wide
+    singletons (get_scheduler, get_backend, ...), which keeps batch
+    helpers such as prefetch_reputation on the same VT queue and quota.
+
+    Heavy models load on first use: the MITRE index on the first
+    match (or warm()), the L3 models on the first predict_l3().
+    """
+
+    def __init__(self, vt: VTScheduler = None, llm: LLMBackend = None):
+        self.vt = vt or get_scheduler()
+        self.rag = ThreatRAG(self.vt)
+        self.llm = llm or get_backend()
+        self.llm_cache = get_response_cache()
+        self.reuse_index = get_reuse_index()
+
+        self._l3 = None
+        self._lock = threading.Lock()
+        self.closed = False
+
+    # ---------------------------------------------------------
+    # Lazily loaded models
+    # ---------------------------------------------------------
+    @property
+    def mitre_index(self):
+        return get_technique_index()
+
+    @property
+    def l3(self):
+        with self._lock:
+            if self._l3 is None:
+                from L3.l3_engine import get_models
+                self._l3 = get_models()
+            return self._l3
+
+    def predict_l3(self, alert: dict, llm_response: dict) -> dict:
+        from L3.l3_engine import predict_l3
+        return predict_l3(alert, llm_response, models=self.l3)
+
+    def warm(self):
+        """Builds the MITRE index now instead of on the first alert."""
+        self.mitre_index
+        return self
+
+    # ---------------------------------------------------------
+    # Shutdown
+    # ---------------------------------------------------------
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        # Cancels queued VT lookups (waiters get CancelledError), then
+        # closes the HTTP pool and VT cache
+        self.vt.close(close_client=True)
+        self.llm.close()
+        if self.llm_cache:
+            self.llm_cache.close()
+        close_history()
+
+        # Forget the closed singletons; a later get_resources() starts fresh
+        for getter in (get_scheduler, get_backend, get_response_cache):
+            getter.cache_clear()
+
+
+# ------------------------------------------------------------
+# Process-wide container
+# ------------------------------------------------------------
+@lru_cache(maxsize=1)
+def get_resources() -> AgentResources:
+    resources = AgentResources()
+    atexit.register(resources.close)
+    return resources
+
+
+def close_resources():
+    """Closes the process-wide container (idempotent)."""
+    if get_resources.cache_info().currsize:
+        get_resources().close()
+        get_resources.cache_clear()
@@ -3,20 +3,70 @@
 # SOAx Agent Runner
 # Executes the full pipeline: RAG → Prompt → LLM → History
 # Returns final state in unified schema format
+# - Async batch mode: many alerts in flight over graph.ainvoke
+# - Packed mode: K alerts per LLM request
 # ============================================================
 
-from framework.graph_definition import graph
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from framework.graph_definition import get_graph
+from framework.resources import AgentResources, get_resources
+from storage.run_checkpoint import RunCheckpoint
+from prompt_builder import build_prompt, build_packed_prompt
+from prompt_generator import parse_llm_response, parse_packed_llm_response
+from LLM import GENERATION_PARAMS, call_llm, call_llm_many
+from storage.history_store import flush_history, save_to_history
 from framework.SOAx_data_schema import (
     AlertSchema,
+    MitreSchema,
     HistoryRecord
 )
 
 from pprint import pprint
 
+# Alerts in flight at once in async batch mode
+ANALYZE_CONCURRENCY = int(os.getenv("ANALYZE_CONCURRENCY", 16))
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+
+def to_history_record(result: dict, verbose: bool = True) -> HistoryRecord:
+    """Final graph state → HistoryRecord (optionally printed)."""
 
-def run_alert(alert: AlertSchema) -> HistoryRecord:
+    # Normalize final JSON
+    final_state: HistoryRecord = {
+        "alert": result.get("alert"),
+        "mitre": result.get("mitre"),
+        "virustotal": result.get("virustotal"),
+        "llm_response": result.get("llm_response")
+    }
+    if result.get("provenance"):
+        final_state["provenance"] = result["provenance"]
+
+    if verbose:
+        if result.get("provenance"):
+            print(f"♻️ Reused analysis (similarity {result['provenance']['similarity']})")
+
+        metrics = result.get("llm_metrics") or {}
+        if metrics.get("time_to_first_field_s") is not None:
+            print(f"⏱️ First field after {metrics['time_to_first_field_s']:.2f}s "
+                  f"(stopped early: {metrics['stopped_early']})")
+
+        print("✅ Final State:")
+        pprint(final_state)
+
+    return final_state
+
+
+def run_alert(alert: AlertSchema, mitre: MitreSchema = None, verbose: bool = True) -> HistoryRecord:
     """
     Runs a single alert through the SOAx Agent Pipeline.
+
+    mitre: optional precomputed MITRE match (skips per-alert matching).
+    verbose: print the full final state.
     
     Returns:
         Final state containing:
@@ -26,22 +76,239 @@ def run_alert(alert: AlertSchema) -> HistoryRecord:
             - llm_response (6 fields)
     """
 
-    print("\n🚀 Running SOAx Agent Pipeline...\n")
+    if verbose:
+        print("\n🚀 Running SOAx Agent Pipeline...\n")
 
-    result = graph.invoke({"alert": alert})
+    result = get_graph().invoke({"alert": alert, "mitre": mitre})
 
-    # Normalize final JSON
-    final_state: HistoryRecord = {
-        "alert": result.get("alert"),
-        "mitre": result.get("mitre"),
-        "virustotal": result.get("virustotal"),
-        "llm_response": result.get("llm_response")
-    }
+    return to_history_record(result, verbose=verbose)
 
-    print("✅ Final State:")
-    pprint(final_state)
 
-    return final_state
+# ------------------------------------------------------------
+# Async pipeline: many alerts in flight
+# ------------------------------------------------------------
+class AlertPipeline:
+    """
+    Keeps up to `concurrency` graph runs in flight. submit() waits for
+    a free slot, so whatever feeds the pipeline is held to its pace
+    (backpressure) and only in-flight alerts are held in memory.
+
+    LLM calls are awaited over one shared backend session; the blocking
+    enrichment and history nodes run on the loop's executor threads.
+    Each finished alert goes to on_result(index, record); an alert that
+    raises is reported and passed as None. With a checkpoint, every
+    submitted alert needs a fingerprint and is recorded done or failed
+    as soon as it finishes.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = ANALYZE_CONCURRENCY,
+        resources: AgentResources = None,
+        checkpoint: RunCheckpoint = None,
+        on_result=None,
+        total: int = None,
+        progress: bool = True,
+        verbose: bool = False
+    ):
+        self.concurrency = concurrency
+        self.resources = resources or get_resources()
+        self.checkpoint = checkpoint
+        self.on_result = on_result
+        self.total = total
+        self.progress = progress
+        self.verbose = verbose
+
+        self.done = 0
+        self.failed = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+
+    async def __aenter__(self):
+        self.graph = get_graph(self.resources)
+
+        # Blocking nodes (VT wait, history write) run on the loop's default
+        # executor; size it so it never caps the in-flight limit
+        # (the stock one is min(32, cpus + 4) threads)
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=2 * self.concurrency, thread_name_prefix="soax-node")
+        )
+
+        # One LLM connection pool for the whole run
+        self._session = self.resources.llm.async_session()
+        self.config = {"configurable": {"llm_session": self._session}}
+
+        self.start = self._last_report = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self.drain()
+        finally:
+            await self._session.aclose()
+
+    async def submit(self, index: int, alert: AlertSchema, mitre: MitreSchema = None,
+                     fingerprint: str = None):
+        await self._slots.acquire()
+        task = asyncio.create_task(self._run(index, alert, mitre, fingerprint))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    async def _run(self, index: int, alert: AlertSchema, mitre: MitreSchema, fingerprint: str):
+        try:
+            result = await self.graph.ainvoke({"alert": alert, "mitre": mitre}, config=self.config)
+            error = None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            self._slots.release()
+
+        self._finish(index, result, error, fingerprint)
+
+    def _finish(self, index: int, result: dict, error: Exception, fingerprint: str):
+        self.done += 1
+        record = None
+
+        if error is not None:
+            self.failed += 1
+            print(f"❌ Alert {index + 1} failed: {error}")
+            if self.checkpoint:
+                self.checkpoint.mark_failed(fingerprint, repr(error))
+        else:
+            if self.verbose:
+                print(f"\n================ ALERT {index + 1} ================\n")
+            record = to_history_record(result, verbose=self.verbose)
+            if self.checkpoint:
+                self.checkpoint.mark_done(fingerprint)
+
+        if self.on_result:
+            self.on_result(index, record)
+
+        now = time.perf_counter()
+        if self.progress and (now - self._last_report >= PROGRESS_INTERVAL or self.done == self.total):
+            self._last_report = now
+            self.report(now)
+
+    def report(self, now: float = None):
+        elapsed = (now or time.perf_counter()) - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+
+        if self.total:
+            eta = (self.total - self.done) / rate if rate else 0.0
+            print(f"[{self.done}/{self.total}] {rate:.1f} alerts/s, ETA {eta:.0f}s, "
+                  f"{self.failed} failed", flush=True)
+        else:
+            print(f"[{self.done}] {rate:.1f} alerts/s, {self.failed} failed", flush=True)
+
+
+async def arun_alerts(
+    alerts: list[AlertSchema],
+    mitre_batch: list[MitreSchema] = None,
+    concurrency: int = ANALYZE_CONCURRENCY,
+    progress: bool = True,
+    verbose: bool = False,
+    resources: AgentResources = None,
+    checkpoint: RunCheckpoint = None,
+    fingerprints: list[str] = None
+) -> list[HistoryRecord]:
+    """
+    Runs a list of alerts through an AlertPipeline. Results keep the
+    input order; failed alerts are None.
+
+    checkpoint + fingerprints (one per alert): each alert is recorded
+    done or failed as soon as it finishes (see analyze.py for resume).
+    """
+
+    mitre_batch = mitre_batch or [None] * len(alerts)
+    fingerprints = fingerprints or [None] * len(alerts)
+    results = [None] * len(alerts)
+
+    def keep(index: int, record: HistoryRecord):
+        results[index] = record
+
+    async with AlertPipeline(concurrency=concurrency, resources=resources, checkpoint=checkpoint,
+                             on_result=keep, total=len(alerts), progress=progress,
+                             verbose=verbose) as pipeline:
+        for i, (alert, mitre) in enumerate(zip(alerts, mitre_batch)):
+            await pipeline.submit(i, alert, mitre, fingerprints[i])
+
+    return results
+
+
+def run_alerts(alerts: list[AlertSchema], **kwargs) -> list[HistoryRecord]:
+    """Blocking wrapper around arun_alerts."""
+    return asyncio.run(arun_alerts(alerts, **kwargs))
+
+
+# ------------------------------------------------------------
+# Packed mode: several alerts per LLM request
+# ------------------------------------------------------------
+def run_alerts_packed(alerts: list[AlertSchema], pack_size: int = 4) -> list[HistoryRecord]:
+    """
+    Enriches all alerts, then analyzes them `pack_size` at a time with
+    one packed prompt per group (the long SOC preamble is sent once per
+    group instead of once per alert). Any alert whose block fails to
+    parse is retried with the normal single-alert prompt.
+    Near-duplicates of past alerts reuse the stored analysis.
+    """
+
+    resources = get_resources()
+    enriched = resources.rag.enrich_alerts(alerts)
+    states = [
+        {"alert": e["original_alert"], "mitre": e["mitre"], "virustotal": e["virustotal"]}
+        for e in enriched
+    ]
+
+    index = resources.reuse_index
+    pending = []
+    for state in states:
+        match = index and index.lookup(state["alert"], state["mitre"], state["virustotal"])
+        if match:
+            record, state["provenance"] = match
+            state["llm_response"] = dict(record["llm_response"])
+        else:
+            pending.append(state)
+
+    groups = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+    raw_outputs = asyncio.run(call_llm_many(
+        [build_packed_prompt(g) for g in groups],
+        max_new_tokens=GENERATION_PARAMS["max_new_tokens"] * pack_size
+    ))
+
+    retries = 0
+
+    for group, raw in zip(groups, raw_outputs):
+        parsed_group = parse_packed_llm_response(raw, len(group))
+
+        for state, parsed in zip(group, parsed_group):
+            if parsed is None:
+                retries += 1
+                parsed = parse_llm_response(call_llm(build_prompt(state)))
+            state["llm_response"] = parsed
+
+    results = []
+    for state in states:
+        record = save_to_history(
+            alert=state["alert"],
+            mitre=state["mitre"],
+            virustotal=state["virustotal"],
+            llm_response=state["llm_response"],
+            provenance=state.get("provenance"),
+            wait=False
+        )
+        if index and not state.get("provenance"):
+            index.add(record)
+        results.append(record)
+    flush_history()
+
+    print(f"📦 Packed mode: {len(alerts)} alerts, {len(alerts) - len(pending)} reused, "
+          f"{len(groups)} packed requests, {retries} single-alert retries")
+
+    return results
 
 
 # ------------------------------------------------------------
@@ -0,0 +1,408 @@
+# ============================================================
+# llm_backends.py
+# Pluggable text-generation backends for LLM.py
+# - remote: HuggingFace InferenceClient (provider or TGI endpoint)
+# - local:  transformers model on CPU, loaded once per process
+#           from huggingface_cache, micro-batched generation
+#
+# Select with LLM_BACKEND=remote|local
+# ============================================================
+
+import os
+import json
+import queue
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import AsyncIterator, Iterator
+
+from huggingface_hub import InferenceClient, AsyncInferenceClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("HF_API_KEY")
+
+MODEL = "fdtn-ai/Foundation-Sec-8B"
+PROVIDER = "featherless-ai"
+
+# Self-hosted TGI-compatible endpoint; replaces MODEL/PROVIDER when set
+LLM_ENDPOINT_URL = os.getenv("LLM_ENDPOINT_URL")
+# Seconds per generation request
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "remote")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HF_CACHE_DIR = os.path.join(BASE_DIR, "huggingface_cache")
+
+# Small instruction model that fits a CPU; any causal LM id works
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+# Dynamic int8 quantization of the Linear layers (CPU only)
+LOCAL_LLM_QUANTIZE = os.getenv("LOCAL_LLM_QUANTIZE", "0") == "1"
+# Prompts generated together, and how long to wait to fill a batch
+LOCAL_LLM_BATCH_SIZE = int(os.getenv("LOCAL_LLM_BATCH_SIZE", 8))
+LOCAL_LLM_BATCH_WAIT = float(os.getenv("LOCAL_LLM_BATCH_WAIT", 0.05))
+
+
+# ------------------------------------------------------------
+# Interface
+# ------------------------------------------------------------
+class LLMBackend(ABC):
+    """
+    What LLM.py needs from a model:
+
+    generate(prompt, params)   → full text
+    stream(prompt, params)     → iterator of text chunks; close()
+                                 cancels the generation
+    async_session()            → async context manager whose session has
+                                 agenerate / astream (same semantics)
+                                 and aclose
+
+    The three are abstract: an incomplete backend fails when it is
+    created, not on the first alert of a run.
+
+    `name` identifies the model in the response cache key.
+    params are GENERATION_PARAMS-style: max_new_tokens, temperature.
+    """
+
+    name = "backend"
+
+    def missing_credentials(self) -> bool:
+        return False
+
+    @abstractmethod
+    def generate(self, prompt: str, params: dict) -> str:
+        ...
+
+    @abstractmethod
+    def stream(self, prompt: str, params: dict) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def async_session(self):
+        ...
+
+    def close(self):
+        pass
+
+
+# ------------------------------------------------------------
+# Remote: HuggingFace Inference (provider or TGI endpoint)
+# ------------------------------------------------------------
+class RemoteHFBackend(LLMBackend):
+
+    def __init__(
+        self,
+        model: str = MODEL,
+        provider: str = PROVIDER,
+        endpoint_url: str = LLM_ENDPOINT_URL,
+        api_key: str = API_KEY,
+        timeout: float = LLM_TIMEOUT
+    ):
+        self.model = model
+        self.provider = provider
+        self.endpoint_url = endpoint_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.name = endpoint_url or model
+        self.client = InferenceClient(**self.client_kwargs())
+
+    def client_kwargs(self) -> dict:
+        if self.endpoint_url:
+            return {"model": self.endpoint_url, "api_key": self.api_key, "timeout": self.timeout}
+        return {"model": self.model, "provider": self.provider,
+                "api_key": self.api_key, "timeout": self.timeout}
+
+    def missing_credentials(self) -> bool:
+        return not self.api_key and not self.endpoint_url
+
+    def generate(self, prompt: str, params: dict) -> str:
+        return self.client.text_generation(prompt, **params)
+
+    def stream(self, prompt: str, params: dict) -> Iterator[str]:
+        # Closing this generator drops the HTTP stream → server cancels
+        return self.client.text_generation(prompt, stream=True, **params)
+
+    def async_session(self):
+        return RemoteAsyncSession(AsyncInferenceClient(**self.client_kwargs()))
+
+    def close(self):
+        self.client.close()
+
+
+class RemoteAsyncSession:
+    """One AsyncInferenceClient (connection pool) shared by many calls."""
+
+    def __init__(self, aclient: AsyncInferenceClient):
+        self.aclient = aclient
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.aclient.close()
+
+    async def agenerate(self, prompt: str, params: dict) -> str:
+        return await self.aclient.text_generation(prompt, **params)
+
+    async def astream(self, prompt: str, params: dict) -> AsyncIterator[str]:
+        return await self.aclient.text_generation(prompt, stream=True, **params)
+
+
+# ------------------------------------------------------------
+# Local: transformers on CPU
+# ------------------------------------------------------------
+class LocalTransformersBackend(LLMBackend):
+    """
+    Loads the model once and keeps it warm. generate() calls from any
+    thread (or async session) are queued and a single worker runs them
+    as one padded batch of up to batch_size prompts, waiting at most
+    batch_wait seconds to fill it. Streams run one prompt at a time.
+    """
+
+    def __init__(
+        self,
+        model_name: str = LOCAL_LLM_MODEL,
+        quantize: bool = LOCAL_LLM_QUANTIZE,
+        batch_size: int = LOCAL_LLM_BATCH_SIZE,
+        batch_wait: float = LOCAL_LLM_BATCH_WAIT
+    ):
+        # Optional dependencies: only needed for this backend
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        self.torch = torch
+        self.name = f"local:{model_name}{':int8' if quantize else ''}"
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=HF_CACHE_DIR)
+        self.tokenizer.padding_side = "left"  # decoder-only: pad before the prompt
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        model = AutoModelForCausalLM.from_pretrained(model_name, cache_dir=HF_CACHE_DIR)
+        model.eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.model = model
+
+        self._model_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._batch_worker, name="local-llm", daemon=True)
+        self._worker.start()
+
+    # ---------------------------------------------------------
+    # Prompt / parameter helpers
+    # ---------------------------------------------------------
+    def format_prompt(self, prompt: str) -> str:
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}],
+                tokenize=False,
+                add_generation_prompt=True
+            )
+        return prompt
+
+    def generate_kwargs(self, params: dict) -> dict:
+        temperature = params.get("temperature", 0)
+        kwargs = {
+            "max_new_tokens": params.get("max_new_tokens", 300),
+            "pad_token_id": self.tokenizer.pad_token_id,
+        }
+        if temperature > 0:
+            kwargs.update(do_sample=True, temperature=temperature)
+        else:
+            kwargs["do_sample"] = False
+        return kwargs
+
+    # ---------------------------------------------------------
+    # Batched generation
+    # ---------------------------------------------------------
+    def submit(self, prompt: str, params: dict) -> Future:
+        future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("Local LLM backend is closed"))
+            return future
+        self._queue.put((prompt, params, future))
+        return future
+
+    def generate(self, prompt: str, params: dict) -> str:
+        return self.submit(prompt, params).result()
+
+    def generate_batch(self, prompts: list[str], params: dict) -> list[str]:
+        inputs = self.tokenizer(
+            [self.format_prompt(p) for p in prompts],
+            padding=True,
+            return_tensors="pt"
+        )
+        with self._model_lock, self.torch.inference_mode():
+            output = self.model.generate(**inputs, **self.generate_kwargs(params))
+
+        new_tokens = output[:, inputs["input_ids"].shape[1]:]
+        return self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+    def _batch_worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            try:
+                while len(batch) < self.batch_size:
+                    nxt = self._queue.get(timeout=self.batch_wait)
+                    if nxt is None:
+                        self._queue.put(None)  # re-deliver shutdown after this batch
+                        break
+                    batch.append(nxt)
+            except queue.Empty:
+                pass
+
+            # Only prompts with identical parameters can share a generate()
+            groups = {}
+            for prompt, params, future in batch:
+                groups.setdefault(json.dumps(params, sort_keys=True), []).append((prompt, params, future))
+
+            for group in groups.values():
+                try:
+                    texts = self.generate_batch([p for p, _, _ in group], group[0][1])
+                    for (_, _, future), text in zip(group, texts):
+                        future.set_result(text)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+
+    # ---------------------------------------------------------
+    # Streaming (single prompt, cancellable)
+    # ---------------------------------------------------------
+    def stream(self, prompt: str, params: dict) -> Iterator[str]:
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        cancelled = threading.Event()
+
+        class Cancel(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return cancelled.is_set()
+
+        inputs = self.tokenizer(self.format_prompt(prompt), return_tensors="pt")
+        # Longest wait for the next chunk (includes waiting for the model)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                        timeout=LLM_TIMEOUT)
+        stream = LocalStream(streamer, cancelled)
+
+        def run():
+            try:
+                with self._model_lock, self.torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        **self.generate_kwargs(params),
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([Cancel()])
+                    )
+            except Exception as e:
+                # Wake the consumer; it re-raises the error
+                stream.error = e
+                streamer.text_queue.put(streamer.stop_signal)
+
+        threading.Thread(target=run, name="local-llm-stream", daemon=True).start()
+        return stream
+
+    def async_session(self):
+        return LocalAsyncSession(self)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+
+class LocalStream:
+    """
+    Token iterator; close() (from any thread) stops generation at the
+    next token. A failed generate() is re-raised here; no chunk within
+    the streamer's timeout raises TimeoutError and cancels generation.
+    """
+
+    def __init__(self, streamer, cancelled: threading.Event):
+        self.streamer = streamer
+        self.cancelled = cancelled
+        self.error = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        text = ""
+        while not text:
+            try:
+                text = next(self.streamer)
+            except StopIteration:
+                if self.error is not None:
+                    raise self.error
+                raise
+            except queue.Empty:
+                self.close()
+                raise TimeoutError(f"no tokens from the local model in {self.streamer.timeout}s")
+        return text
+
+    def close(self):
+        self.cancelled.set()
+
+
+class LocalAsyncSession:
+    """Async view of the local backend; batching happens in its worker."""
+
+    def __init__(self, backend: LocalTransformersBackend):
+        self.backend = backend
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def aclose(self):
+        pass  # the backend (and its worker) outlive the session
+
+    async def agenerate(self, prompt: str, params: dict) -> str:
+        return await asyncio.wrap_future(self.backend.submit(prompt, params))
+
+    async def astream(self, prompt: str, params: dict) -> AsyncIterator[str]:
+        return self._iterate(self.backend.stream(prompt, params))
+
+    async def _iterate(self, stream: Iterator[str]) -> AsyncIterator[str]:
+        try:
+            while True:
+                text = await asyncio.to_thread(next, stream, None)
+                if text is None:
+                    return
+                yield text
+        finally:
+            stream.close()
+
+
+# ------------------------------------------------------------
+# Process-wide backend
+# ------------------------------------------------------------
+BACKENDS = {
+    "remote": RemoteHFBackend,
+    "local": LocalTransformersBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = None) -> LLMBackend:
+    name = name or LLM_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
@@ -2,16 +2,47 @@
 # SOAx Prompt Builder
 # Unified SOC L1 Prompt with MITRE + VirusTotal Intelligence
 # Generates the exact 6-field format the LLM must output
+# - Packed mode: one prompt, K alerts, one delimited block each
 # ============================================================
 
-def build_prompt(state: dict) -> str:
-    """
-    state = {
-        "alert": {...},
-        "mitre": {...},
-        "virustotal": {...}
-    }
-    """
+ANALYST_PREAMBLE = """
+You are a Senior SOC Level 1 Cybersecurity Analyst specializing in rapid alert triage, behavioral threat analysis, and intelligence-driven decision-making.
+
+Your primary responsibility is to analyze this alert based on its context.  
+MITRE ATT&CK and VirusTotal data are provided only as optional enrichment:
+- Use them only if they logically match the alert behavior.
+- If they do not clearly apply, ignore them completely.
+- Never force irrelevant or misleading intelligence into your analysis.
+
+All final conclusions must be accurate, concise, SOC-ready, and must fill every required field with meaningful content.
+""".strip()
+
+OUTPUT_RULES = """
+IMPORTANT RULES:
+- Output MUST contain ONLY the 6 required fields listed below.
+- No extra words, no explanations, no markdown.
+- Keep answers short, clear, and SOC-friendly.
+- DO NOT repeat the alert description.
+- DO NOT leave any field empty or N/A.
+- Use the MITRE + VirusTotal data logically to produce the best analysis.
+""".strip()
+
+OUTPUT_FIELDS = """
+Risk Score: <1-10 ONLY>
+MITRE ATT&CK Technique: <ID + Name>
+Behavioral Pattern: <short clear behavior>
+Evidence Needed: <list of evidence>
+IR Action: <specific SOC action>
+AI Recommendation: <Ignore / Monitor / Escalate + reason>
+""".strip()
+
+# Delimiters for packed mode (parsed by prompt_generator)
+ALERT_BLOCK_START = "=== ALERT {index} ==="
+ALERT_BLOCK_END = "=== END ALERT {index} ==="
+
+
+def build_context(state: dict) -> str:
+    """ALERT CONTEXT + MITRE + VIRUSTOTAL sections for one alert."""
 
     alert = state.get("alert", {})
     mitre = state.get("mitre", {})
@@ -34,28 +65,7 @@ def build_prompt(state: dict) -> str:
     vt_score = vt.get("community_score", 0)
     vt_vendor_count = vt.get("malicious_vendors_count", "N/A")
 
-    # -----------------------------
-    # 🔵 Build Final Prompt
-    # -----------------------------
     return f"""
-You are a Senior SOC Level 1 Cybersecurity Analyst specializing in rapid alert triage, behavioral threat analysis, and intelligence-driven decision-making.
-
-Your primary responsibility is to analyze this alert based on its context.  
-MITRE ATT&CK and VirusTotal data are provided only as optional enrichment:
-- Use them only if they logically match the alert behavior.
-- If they do not clearly apply, ignore them completely.
-- Never force irrelevant or misleading intelligence into your analysis.
-
-All final conclusions must be accurate, concise, SOC-ready, and must fill every required field with meaningful content.
-
-IMPORTANT RULES:
-- Output MUST contain ONLY the 6 required fields listed below.
-- No extra words, no explanations, no markdown.
-- Keep answers short, clear, and SOC-friendly.
-- DO NOT repeat the alert description.
-- DO NOT leave any field empty or N/A.
-- Use the MITRE + VirusTotal data logically to produce the best analysis.
-
 ========================
 ALERT CONTEXT
 ========================
@@ -80,15 +90,69 @@ Community Score: {vt_score}
 Malicious (Red Flags): {vt_mal}
 Suspicious (Yellow Flags): {vt_susp}
 Clean (Green Flags): {vt_clean}
+""".strip()
+
+
+def build_prompt(state: dict) -> str:
+    """
+    state = {
+        "alert": {...},
+        "mitre": {...},
+        "virustotal": {...}
+    }
+    """
+
+    # -----------------------------
+    # 🔵 Build Final Prompt
+    # -----------------------------
+    return f"""
+{ANALYST_PREAMBLE}
+
+{OUTPUT_RULES}
+
+{build_context(state)}
 
 ========================
 REQUIRED OUTPUT FORMAT
 ========================
-Risk Score: <1-10 ONLY>
-MITRE ATT&CK Technique: <ID + Name>
-Behavioral Pattern: <short clear behavior>
-Evidence Needed: <list of evidence>
-IR Action: <specific SOC action>
-AI Recommendation: <Ignore / Monitor / Escalate + reason>
+{OUTPUT_FIELDS}
+
+""".strip()
+
+
+def build_packed_prompt(states: list[dict]) -> str:
+    """
+    One prompt for K alerts: the shared preamble is paid once, each
+    alert gets its own numbered block, and the model must answer with
+    one delimited 6-field block per alert, in order.
+    """
+
+    blocks = []
+    for index, state in enumerate(states, start=1):
+        blocks.append(f"""
+{ALERT_BLOCK_START.format(index=index)}
+{build_context(state)}
+{ALERT_BLOCK_END.format(index=index)}
+""".strip())
+
+    alert_blocks = "\n\n".join(blocks)
+    count = len(states)
+
+    return f"""
+{ANALYST_PREAMBLE}
+
+You will analyze {count} independent alerts. Analyze each one on its own context only.
+
+{OUTPUT_RULES}
+- Answer every alert, in order, each inside its own delimiters.
+
+{alert_blocks}
+
+========================
+REQUIRED OUTPUT FORMAT (repeat for alerts 1..{count})
+========================
+{ALERT_BLOCK_START.format(index="<n>")}
+{OUTPUT_FIELDS}
+{ALERT_BLOCK_END.format(index="<n>")}
 
 """.strip()
@@ -5,9 +5,13 @@
 # - Removes garbage formatting
 # - Prevents N/A results
 # - Ensures SOC-safe fallbacks
+# - Multi-record parser for packed (K-alert) responses
+# - Incremental parser for streamed generation (early stop)
 # ============================================================
 
 import re
+import time
+from typing import Optional
 from framework.SOAx_data_schema import LLMResponseSchema
 
 
@@ -36,8 +40,9 @@ def extract_field(label: str, text: str) -> str:
 
     value = match.group(1).strip()
 
-    # Remove bullets, numbering, weird characters
-    value = re.sub(r"^[\-\•\d\.\)\s]+", "", value).strip()
+    # Remove bullets and list numbering ("- ", "• ", "1. ", "2) ")
+    # but keep bare values such as the risk score "7"
+    value = re.sub(r"^(?:[\-\•]+|\d+[\.\)](?=\s))\s*", "", value).strip()
 
     # Stop when next field appears
     stop_labels = [
@@ -115,16 +120,127 @@ in security operations workflows.
 """
 
 
-    parsed = {
-        "risk_score": extract_field("Risk Score:", raw_output),
-        "mitre": extract_field("MITRE ATT&CK Technique:", raw_output),
-        "behavior": extract_field("Behavioral Pattern:", raw_output),
-        "evidence": extract_field("Evidence Needed:", raw_output),
-        "ir_action": extract_field("IR Action:", raw_output),
-        "recommendation": extract_field("AI Recommendation:", raw_output)
-    }
+    parsed = extract_all(raw_output)
 
     # Normalize & fallback if needed
     final = normalize(parsed)
 
     return final
+
+
+# -----------------------------
+# Raw field extraction (no fallbacks)
+# -----------------------------
+FIELD_LABELS = {
+    "risk_score": "Risk Score:",
+    "mitre": "MITRE ATT&CK Technique:",
+    "behavior": "Behavioral Pattern:",
+    "evidence": "Evidence Needed:",
+    "ir_action": "IR Action:",
+    "recommendation": "AI Recommendation:"
+}
+
+
+def extract_all(raw_output: str) -> dict:
+    return {
+        field: extract_field(label, raw_output)
+        for field, label in FIELD_LABELS.items()
+    }
+
+
+# -----------------------------
+# Incremental parser (streamed output)
+# -----------------------------
+class StreamingParser:
+    """
+    Fed token by token. A field counts as parsed once its line is
+    finished (a newline follows it), so a value is never reported
+    half-written. `complete` turns True as soon as all six fields are
+    in, which is the caller's signal to cancel generation.
+
+    on_field(field, value, elapsed_s) fires once per field as it lands,
+    e.g. to show partial triage in the UI.
+    """
+
+    def __init__(self, on_field=None):
+        self.on_field = on_field
+        self.buffer = ""
+        self.fields = {}
+        self.started = time.monotonic()
+        self.first_field_s = None
+        self.complete_s = None
+
+    @property
+    def complete(self) -> bool:
+        return len(self.fields) == len(FIELD_LABELS)
+
+    def feed(self, chunk: str) -> list[str]:
+        """Adds streamed text; returns the fields completed by it."""
+        self.buffer += chunk
+        if "\n" not in chunk or self.complete:
+            return []
+        return self._scan(self.buffer[:self.buffer.rfind("\n")])
+
+    def finish(self) -> LLMResponseSchema:
+        """End of stream: the last line needs no newline. Returns the record."""
+        if not self.complete:
+            self._scan(self.buffer)
+        return normalize(self.fields)
+
+    def _scan(self, text: str) -> list[str]:
+        landed = []
+        for field, label in FIELD_LABELS.items():
+            if field in self.fields:
+                continue
+            value = extract_field(label, text)
+            if value:
+                self.fields[field] = value
+                landed.append(field)
+
+        if landed:
+            elapsed = time.monotonic() - self.started
+            if self.first_field_s is None:
+                self.first_field_s = elapsed
+            if self.complete:
+                self.complete_s = elapsed
+            if self.on_field:
+                for field in landed:
+                    self.on_field(field, self.fields[field], elapsed)
+
+        return landed
+
+
+# -----------------------------
+# Packed (multi-alert) output parser
+# -----------------------------
+BLOCK_PATTERN = re.compile(
+    r"=+\s*ALERT\s+(\d+)\s*=+(.*?)"
+    r"(?:=+\s*END\s+ALERT\s+\1\s*=+|(?==+\s*ALERT\s+\d+\s*=+)|\Z)",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def parse_packed_llm_response(raw_output: str, count: int) -> list[Optional[LLMResponseSchema]]:
+    """
+    Splits a packed response (see prompt_builder.build_packed_prompt)
+    into `count` records, by alert index.
+
+    A block that is missing, or lacks any of the six fields, yields None
+    so the caller can retry that alert on its own. SOC-safe fallbacks are
+    applied only to complete blocks.
+    """
+    blocks = {}
+    for match in BLOCK_PATTERN.finditer(raw_output or ""):
+        index = int(match.group(1))
+        if 1 <= index <= count and index not in blocks:
+            blocks[index] = match.group(2)
+
+    results = []
+    for index in range(1, count + 1):
+        parsed = extract_all(blocks.get(index, ""))
+        if all(parsed.values()):
+            results.append(normalize(parsed))
+        else:
+            results.append(None)
+
+    return results
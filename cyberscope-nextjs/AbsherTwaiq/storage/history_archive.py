@@ -0,0 +1,549 @@
+# ================================================
+# storage/history_archive.py
+# Segmented, compressed history archive for SOAx
+# - Time-bucketed segments: the current one is an
+#   append-only JSON-lines file, past ones are sealed:
+#   compressed in independent blocks (gzip | zstd)
+#   plus a small sparse index (time range per block)
+# - Range reads open only overlapping segments (mmap)
+#   and decompress only overlapping blocks
+# - Retention (drop old segments) and compaction
+#   (merge old segments into wider ones)
+# ================================================
+
+import os
+import re
+import gzip
+import json
+import mmap
+import time
+import uuid
+import itertools
+import threading
+from typing import Iterable, Iterator
+
+from storage.file_lock import FileLock
+from storage.history_db import Timestamp, to_timestamp
+from framework.SOAx_data_schema import HistoryRecord
+
+DAY = 86400
+
+# Width of a live segment (default: one per day)
+HISTORY_SEGMENT_SECONDS = int(os.getenv("HISTORY_SEGMENT_SECONDS", DAY))
+# Codec for sealed segments: gzip | zstd (needs the zstandard package)
+HISTORY_COMPRESSION = os.getenv("HISTORY_COMPRESSION", "gzip")
+# Records per compressed block (one sparse-index entry each)
+HISTORY_BLOCK_RECORDS = int(os.getenv("HISTORY_BLOCK_RECORDS", 1000))
+# Sealed segments older than this are deleted (0 = keep forever)
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", 0))
+# Sealed segments older than this are merged into HISTORY_COMPACT_SPAN_DAYS-wide ones (0 = never)
+HISTORY_COMPACT_AFTER_DAYS = float(os.getenv("HISTORY_COMPACT_AFTER_DAYS", 7))
+HISTORY_COMPACT_SPAN_DAYS = float(os.getenv("HISTORY_COMPACT_SPAN_DAYS", 30))
+
+CODECS = {"gzip": ".gz", "zstd": ".zst"}
+SEGMENT_PATTERN = re.compile(r"^seg-(\d+)-(\d+)\.jsonl$")
+INDEX_PATTERN = re.compile(r"^seg-(\d+)-(\d+)\.idx\.json$")
+
+
+# ------------------------------------------------
+# Codecs (one frame / member per block)
+# ------------------------------------------------
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if codec == "zstd":
+        import zstandard  # optional dependency
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Unknown HISTORY_COMPRESSION {codec!r} (expected one of {', '.join(CODECS)})")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+# ------------------------------------------------
+# Segments
+# ------------------------------------------------
+class Segment:
+    """One time bucket [start, end): live (.jsonl) or sealed (compressed + index)."""
+
+    def __init__(self, directory: str, start: int, end: int):
+        self.directory = directory
+        self.start = start
+        self.end = end
+        self.name = f"seg-{start:010d}-{end:010d}"
+
+    @property
+    def live_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.jsonl")
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.idx.json")
+
+    def data_path(self, codec: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.jsonl{CODECS[codec]}")
+
+    @property
+    def sealed(self) -> bool:
+        # The index is written last: no index, not sealed
+        return os.path.exists(self.index_path)
+
+    def load_index(self) -> dict:
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def overlaps(self, start: float, end: float) -> bool:
+        return self.start < end and start < self.end
+
+    def covers(self, other: "Segment") -> bool:
+        return self.start <= other.start and other.end <= self.end and self.name != other.name
+
+
+def _lines(buffer) -> Iterator[dict]:
+    """Parsed entries of a JSON-lines buffer; a torn line is skipped."""
+    start = 0
+    size = len(buffer)
+    while start < size:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            end = size
+        line = buffer[start:end].strip()
+        start = end + 1
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def _mapped(path: str):
+    """Read-only mmap of a file (None when it is empty)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _scan_sealed(index: dict, mapped, start: float, end: float) -> Iterator[dict]:
+    """Entries in [start, end) of a mapped sealed segment (blocks outside are skipped)."""
+    if mapped is None:
+        return
+    try:
+        for low, high, offset, length, _ in index["blocks"]:
+            if high < start or low >= end:
+                continue
+            data = decompress(mapped[offset:offset + length], index["codec"])
+            for entry in _lines(data):
+                if start <= entry["ingested"] < end:
+                    yield entry
+    finally:
+        mapped.close()
+
+
+def _scan_live(mapped, start: float, end: float) -> Iterator[dict]:
+    if mapped is None:
+        return
+    try:
+        for entry in _lines(mapped):
+            if start <= entry["ingested"] < end:
+                yield entry
+    finally:
+        mapped.close()
+
+
+def _write_atomic(path: str, chunks: Iterable[bytes]):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ------------------------------------------------
+# Archive
+# ------------------------------------------------
+class HistoryArchive:
+    """
+    History as a directory of time-bucketed segments. Records are
+    appended, with their ingestion time, to the live segment of the
+    current bucket; once the bucket is over the segment is sealed:
+    rewritten in compressed blocks of block_records entries, with an
+    index of each block's time range and byte range.
+
+    Reading a time range lists segment names (which carry their
+    bounds), maps only the overlapping files and decompresses only
+    the overlapping blocks, so memory follows the range asked for,
+    not the size of history.
+
+    Appends, sealing, retention and compaction run under one file
+    lock, so several processes can share an archive. A read maps its
+    segments under that lock and then reads from the mappings, so it
+    sees one consistent set of segments even if they are sealed,
+    compacted or dropped meanwhile.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fsync: str = "interval",
+        fsync_interval: float = 1.0,
+        segment_seconds: int = HISTORY_SEGMENT_SECONDS,
+        compression: str = HISTORY_COMPRESSION,
+        block_records: int = HISTORY_BLOCK_RECORDS,
+        retention_days: float = HISTORY_RETENTION_DAYS,
+        compact_after_days: float = HISTORY_COMPACT_AFTER_DAYS,
+        compact_span_days: float = HISTORY_COMPACT_SPAN_DAYS
+    ):
+        if compression not in CODECS:
+            raise ValueError(f"Unknown HISTORY_COMPRESSION {compression!r} (expected one of {', '.join(CODECS)})")
+
+        self.path = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.segment_seconds = segment_seconds
+        self.compression = compression
+        self.block_records = block_records
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self.compact_span_days = compact_span_days
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(directory, "archive"))
+        self._live = None        # Segment being appended to
+        self._file = None
+        self._last_sync = time.monotonic()
+        self.closed = False
+
+        # Seal what a previous run (or a crash) left behind
+        self.maintain()
+
+    # ---------------------------------------------------------
+    # Segment listing
+    # ---------------------------------------------------------
+    def segments(self) -> list[Segment]:
+        """Every segment (live and sealed), oldest first."""
+        bounds = set()
+        for name in os.listdir(self.path):
+            match = SEGMENT_PATTERN.match(name) or INDEX_PATTERN.match(name)
+            if match:
+                bounds.add((int(match.group(1)), int(match.group(2))))
+        return [Segment(self.path, start, end) for start, end in sorted(bounds)]
+
+    def _bucket(self, ts: float) -> Segment:
+        start = int(ts // self.segment_seconds) * self.segment_seconds
+        return Segment(self.path, start, start + self.segment_seconds)
+
+    # ---------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------
+    def append(self, record: HistoryRecord):
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[HistoryRecord], ingested: Timestamp = None) -> int:
+        records = list(records)
+
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("History archive is closed")
+
+            with self._file_lock:
+                # Read the clock under the lock: a bucket another process
+                # has sealed is never written to again
+                ts = time.time() if ingested is None else to_timestamp(ingested)
+                bucket = self._bucket(ts)
+                while bucket.sealed:
+                    # Sealed by a process whose clock runs ahead of ours
+                    ts = bucket.end
+                    bucket = self._bucket(ts)
+                # Reopen a live file that was sealed (here or by another process)
+                if self._live is None or self._live.name != bucket.name or not os.path.exists(bucket.live_path):
+                    self._rotate(bucket)
+
+                data = "".join(
+                    json.dumps({"ingested": ts, "record": record}, ensure_ascii=False) + "\n"
+                    for record in records
+                ).encode("utf-8")
+                self._file.write(data)
+                self._file.flush()
+                self._sync_policy()
+
+        return len(records)
+
+    def _rotate(self, bucket: Segment):
+        if self._file:
+            self._file.close()
+        self._live = bucket
+        self._file = open(bucket.live_path, "ab")
+        # A crash mid-append leaves a torn line; end it (readers skip it)
+        size = self._file.seek(0, os.SEEK_END)
+        if size:
+            with open(bucket.live_path, "rb") as f:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")
+        self._maintain_locked(now=bucket.start)
+
+    def _sync_policy(self):
+        if self.fsync == "always":
+            os.fsync(self._file.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+
+    # ---------------------------------------------------------
+    # Sealing, retention, compaction
+    # ---------------------------------------------------------
+    def maintain(self, now: float = None):
+        """Seals finished buckets, then applies retention and compaction."""
+        with self._lock, self._file_lock:
+            self._maintain_locked(now)
+
+    def _maintain_locked(self, now: float = None):
+        now = time.time() if now is None else now
+        current = self._bucket(now)
+
+        for segment in self.segments():
+            if os.path.exists(segment.live_path) and segment.end <= current.start:
+                self._seal(segment)
+
+        self._drop_covered()
+        if self.retention_days:
+            self._apply_retention(now)
+        if self.compact_after_days:
+            self._compact(now)
+
+    def _seal(self, segment: Segment):
+        # Already sealed means a crash hit between index and removal
+        if not segment.sealed:
+            self._write_sealed(segment, self._read_live(segment, 0, float("inf")))
+        os.remove(segment.live_path)
+
+    def _packed_blocks(self, entries: Iterable[dict], codec: str, blocks: list,
+                       offset: int = 0) -> Iterator[bytes]:
+        """Compresses entries block by block; appends each block's index row to `blocks`."""
+        entries = iter(entries)
+        while True:
+            block = list(itertools.islice(entries, self.block_records))
+            if not block:
+                return
+            raw = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in block).encode("utf-8")
+            packed = compress(raw, codec)
+            times = [e["ingested"] for e in block]
+            blocks.append([min(times), max(times), offset, len(packed), len(block)])
+            offset += len(packed)
+            yield packed
+
+    def _write_sealed(self, segment: Segment, entries: Iterable[dict], sources: list[str] = ()):
+        """
+        Compressed blocks first, index last (the index marks the seal).
+        Every sealed segment gets a unique id; sources: ids of the
+        segments merged into this one.
+        """
+        blocks = []
+        _write_atomic(segment.data_path(self.compression),
+                      self._packed_blocks(entries, self.compression, blocks))
+        index = {
+            "start": segment.start,
+            "end": segment.end,
+            "codec": self.compression,
+            "count": sum(b[4] for b in blocks),
+            "blocks": blocks,
+            "id": uuid.uuid4().hex,
+            "sources": list(sources),
+        }
+        _write_atomic(segment.index_path, [json.dumps(index).encode("utf-8")])
+
+    def _merge_into(self, target: Segment, late: list[Segment]):
+        """
+        Appends the entries of `late` (sealed segments inside target's
+        span) to target as new blocks, then rewrites its index. A crash
+        before the index is replaced leaves unindexed bytes at the end
+        of the data file, which readers never touch, and `late` still
+        in place, so the next maintenance merges it again.
+        """
+        index = target.load_index()
+        blocks = []
+        with open(target.data_path(index["codec"]), "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            entries = itertools.chain.from_iterable(
+                self._read_sealed(segment, 0, float("inf")) for segment in late
+            )
+            for packed in self._packed_blocks(entries, index["codec"], blocks, offset):
+                f.write(packed)
+            f.flush()
+            os.fsync(f.fileno())
+
+        index["blocks"] += blocks
+        index["count"] += sum(b[4] for b in blocks)
+        index["sources"] = index.get("sources", []) + self._sources_of(late)
+        _write_atomic(target.index_path, [json.dumps(index).encode("utf-8")])
+
+    @staticmethod
+    def _sources_of(segments: list[Segment]) -> list[str]:
+        """Ids of sealed `segments` and of everything already merged into them."""
+        ids = []
+        for segment in segments:
+            index = segment.load_index()
+            ids += [index.get("id")] + index.get("sources", [])
+        return [i for i in ids if i]
+
+    def _delete(self, segment: Segment):
+        # Index first: without it the segment no longer counts as sealed
+        for path in [segment.index_path, segment.live_path] + [segment.data_path(c) for c in CODECS]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _drop_covered(self):
+        # A compaction that stopped after writing its merged segment
+        # leaves its sources behind: the merged one replaces them. A
+        # segment sealed later inside a compacted span (e.g. back-dated
+        # records, possibly under a source's name) holds records the
+        # merged one lacks: merge it in.
+        sealed = [s for s in self.segments() if s.sealed]
+        for cover in sealed:
+            if not cover.sealed:
+                continue  # itself covered, deleted earlier in this loop
+            covered = [s for s in sealed if cover.covers(s) and s.sealed]
+            if not covered:
+                continue
+            sources = set(cover.load_index().get("sources", []))
+            late = [s for s in covered if s.load_index().get("id") not in sources]
+            if late:
+                self._merge_into(cover, late)
+            for segment in covered:
+                self._delete(segment)
+
+    def _apply_retention(self, now: float):
+        cutoff = now - self.retention_days * DAY
+        for segment in self.segments():
+            if segment.sealed and segment.end <= cutoff:
+                self._delete(segment)
+
+    def _compact(self, now: float):
+        cutoff = now - self.compact_after_days * DAY
+        span = int(self.compact_span_days * DAY)
+        if span <= self.segment_seconds:
+            return
+
+        # Only spans that are entirely past the cutoff, so each is merged once
+        groups = {}
+        for segment in self.segments():
+            if segment.sealed and (segment.start // span + 1) * span <= cutoff:
+                groups.setdefault(segment.start // span, []).append(segment)
+
+        for key, group in groups.items():
+            merged = Segment(self.path, key * span, (key + 1) * span)
+            # A span compacted before takes late segments in _drop_covered
+            if len(group) < 2 or any(s.name == merged.name for s in group):
+                continue
+            # Segments are time-ordered and disjoint: concatenation stays ordered
+            self._write_sealed(merged, itertools.chain.from_iterable(
+                self._read_sealed(segment, 0, float("inf")) for segment in group
+            ), sources=self._sources_of(group))
+            for segment in group:
+                self._delete(segment)
+
+    # ---------------------------------------------------------
+    # Reads
+    # ---------------------------------------------------------
+    def _read_sealed(self, segment: Segment, start: float, end: float) -> Iterator[dict]:
+        index = segment.load_index()
+        return _scan_sealed(index, _mapped(segment.data_path(index["codec"])), start, end)
+
+    def _read_live(self, segment: Segment, start: float, end: float) -> Iterator[dict]:
+        return _scan_live(_mapped(segment.live_path), start, end)
+
+    def _open_range(self, start: float, end: float) -> list[tuple]:
+        """
+        Maps every segment overlapping [start, end) now; call under both
+        locks. Returns (reader, mapping) pairs.
+        """
+        segments = [s for s in self.segments() if s.overlaps(start, end)]
+        indexes = {s.name: s.load_index() for s in segments if s.sealed}
+        # Left behind by an interrupted compaction: already in its merged segment
+        merged = {source for index in indexes.values() for source in index.get("sources", [])}
+
+        readers = []
+        for segment in segments:
+            index = indexes.get(segment.name)
+            if index is not None and index.get("id") in merged:
+                continue
+            if index is not None:
+                mapped = _mapped(segment.data_path(index["codec"]))
+                readers.append((_scan_sealed(index, mapped, start, end), mapped))
+            else:
+                mapped = _mapped(segment.live_path)
+                readers.append((_scan_live(mapped, start, end), mapped))
+        return readers
+
+    def iter_entries(self, start: Timestamp = None, end: Timestamp = None) -> Iterator[dict]:
+        """{"ingested", "record"} entries in [start, end), segment by segment."""
+        start = 0.0 if start is None else to_timestamp(start)
+        end = float("inf") if end is None else to_timestamp(end)
+
+        with self._lock, self._file_lock:
+            readers = self._open_range(start, end)
+
+        try:
+            for reader, _ in readers:
+                yield from reader
+        finally:
+            # Readers never started still hold their mapping
+            for _, mapped in readers:
+                if mapped is not None:
+                    mapped.close()
+
+    def iter_range(self, start: Timestamp = None, end: Timestamp = None) -> Iterator[HistoryRecord]:
+        """Records ingested in [start, end), oldest segment first."""
+        for entry in self.iter_entries(start, end):
+            yield entry["record"]
+
+    def iter_records(self) -> Iterator[HistoryRecord]:
+        return self.iter_range()
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        sealed = [s for s in segments if s.sealed]
+        size = sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in os.listdir(self.path) if name.startswith("seg-")
+        )
+        return {
+            "segments": len(segments),
+            "sealed": len(sealed),
+            "sealed_records": sum(s.load_index()["count"] for s in sealed),
+            "bytes": size,
+        }
+
+    # ---------------------------------------------------------
+    # Shutdown
+    # ---------------------------------------------------------
+    def sync(self):
+        with self._lock:
+            if self._file and not self.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._file:
+                self._file.flush()
+                if self.fsync != "never":
+                    os.fsync(self._file.fileno())
+                self._file.close()
@@ -0,0 +1,377 @@
+# ================================================
+# storage/history_db.py
+# Indexed SQLite history store for SOAx
+# - One row per HistoryRecord + ingestion time
+# - Indexed: source_ip, username, MITRE id,
+#   risk_score, ingestion time
+# - Query API: find_by_ip / _user / _technique /
+#   _risk, since, top_ips, keyset-paginated pages
+# - MITRE and VirusTotal payloads interned in
+#   content-addressed tables; rows keep their keys
+# ================================================
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Union
+
+from framework.SOAx_data_schema import HistoryRecord
+
+# SQLite synchronous level per history fsync policy (see history_store)
+SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+PAGE_SIZE = 500
+
+# Record field → content-addressed table holding its payloads
+PAYLOAD_TABLES = {"mitre": "mitre_payloads", "virustotal": "vt_payloads"}
+# Parsed payloads kept per table (a few hundred techniques / IPs in practice)
+PAYLOAD_CACHE_SIZE = 4096
+
+Timestamp = Union[float, int, datetime]
+
+
+def to_timestamp(value: Timestamp) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+def payload_key(payload: dict) -> str:
+    """Content address: hash of the canonical JSON."""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def risk_value(record: HistoryRecord) -> Optional[float]:
+    """LLM risk_score as a number ("7", 7, "7/10"); None for "N/A"."""
+    score = (record.get("llm_response") or {}).get("risk_score")
+    try:
+        return float(str(score).split("/")[0].strip())
+    except ValueError:
+        return None
+
+
+class HistoryDB:
+    """
+    History as rows instead of one document: every lookup below is an
+    index seek, so the dashboard and analysts never parse the whole
+    history. The record itself is stored as JSON next to the columns
+    it is indexed by.
+
+    The MITRE technique (description, mitigations, references) and
+    the VT report (WHOIS) repeat across thousands of alerts, so each
+    distinct payload is stored once, under its hash, and rows keep
+    only the keys. Reads put the payloads back (hydrate=False returns
+    the keys as mitre_key / virustotal_key; hydrate() expands later).
+    Hydrated records share payload dicts: treat them as read-only.
+
+    Safe to share across threads (one connection behind a lock) and
+    across processes (SQLite file locking, WAL).
+    """
+
+    def __init__(self, path: str, fsync: str = "interval"):
+        self.path = path
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={SYNCHRONOUS[fsync]}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                id          INTEGER PRIMARY KEY,
+                ingested    REAL NOT NULL,
+                source_ip   TEXT,
+                username    TEXT,
+                mitre_id    TEXT,
+                risk_score  REAL,
+                record      TEXT NOT NULL,
+                mitre_key   TEXT,
+                vt_key      TEXT
+            );
+            CREATE TABLE IF NOT EXISTS mitre_payloads (
+                key         TEXT PRIMARY KEY,
+                payload     TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS vt_payloads (
+                key         TEXT PRIMARY KEY,
+                payload     TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_ip ON history (source_ip, ingested);
+            CREATE INDEX IF NOT EXISTS history_user ON history (username, ingested);
+            CREATE INDEX IF NOT EXISTS history_mitre ON history (mitre_id, ingested);
+            CREATE INDEX IF NOT EXISTS history_risk ON history (risk_score);
+            CREATE INDEX IF NOT EXISTS history_time ON history (ingested);
+            """
+        )
+        self._conn.commit()
+        self._payload_cache = {table: OrderedDict() for table in PAYLOAD_TABLES.values()}
+        self.closed = False
+
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(history)")}
+        if "mitre_key" not in columns:
+            self._intern_legacy_rows()
+
+    # ---------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------
+    @staticmethod
+    def _split(record: HistoryRecord) -> tuple[dict, dict, list]:
+        """Record without its payloads, their keys, and (table, key, json) rows to intern."""
+        stripped = dict(record)
+        keys = {}
+        payloads = []
+        for field, table in PAYLOAD_TABLES.items():
+            payload = record.get(field)
+            if not payload:
+                continue
+            key = payload_key(payload)
+            stripped[field] = None
+            keys[field] = key
+            payloads.append((table, key, json.dumps(payload, ensure_ascii=False)))
+        return stripped, keys, payloads
+
+    def _row(self, record: HistoryRecord, ingested: float, payloads: list) -> tuple:
+        alert = record.get("alert") or {}
+        stripped, keys, record_payloads = self._split(record)
+        payloads.extend(record_payloads)
+        return (
+            ingested,
+            alert.get("source_ip"),
+            alert.get("username"),
+            (record.get("mitre") or {}).get("id"),
+            risk_value(record),
+            json.dumps(stripped, ensure_ascii=False),
+            keys.get("mitre"),
+            keys.get("virustotal"),
+        )
+
+    def _intern(self, payloads: list):
+        for table in PAYLOAD_TABLES.values():
+            rows = [(key, payload) for t, key, payload in payloads if t == table]
+            if rows:
+                self._conn.executemany(f"INSERT OR IGNORE INTO {table} VALUES (?, ?)", rows)
+
+    def _intern_legacy_rows(self):
+        # Stores created before interning: add the key columns and
+        # move every embedded payload into its table, in place
+        with self._lock:
+            self._conn.execute("ALTER TABLE history ADD COLUMN mitre_key TEXT")
+            self._conn.execute("ALTER TABLE history ADD COLUMN vt_key TEXT")
+            rows = self._conn.execute("SELECT id, record FROM history").fetchall()
+
+            payloads = []
+            updates = []
+            for row_id, record in rows:
+                stripped, keys, record_payloads = self._split(json.loads(record))
+                payloads.extend(record_payloads)
+                updates.append((json.dumps(stripped, ensure_ascii=False),
+                                keys.get("mitre"), keys.get("virustotal"), row_id))
+
+            self._intern(payloads)
+            self._conn.executemany(
+                "UPDATE history SET record = ?, mitre_key = ?, vt_key = ? WHERE id = ?", updates
+            )
+            self._conn.commit()
+            # Give the freed pages back to the file system
+            self._conn.execute("VACUUM")
+
+    def append(self, record: HistoryRecord, ingested: Timestamp = None):
+        self.append_many([record], ingested)
+
+    def append_many(self, records: Iterable[HistoryRecord], ingested: Timestamp = None) -> int:
+        """Inserts records in one transaction; returns how many."""
+        ingested = time.time() if ingested is None else to_timestamp(ingested)
+        payloads = []
+        rows = [self._row(record, ingested, payloads) for record in records]
+
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("History store is closed")
+            self._intern(payloads)
+            self._conn.executemany(
+                "INSERT INTO history (ingested, source_ip, username, mitre_id, risk_score, "
+                "record, mitre_key, vt_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    # ---------------------------------------------------------
+    # Reads
+    # ---------------------------------------------------------
+    # Every record query selects these, in this order
+    RECORD_COLUMNS = "record, mitre_key, vt_key"
+
+    def _records(self, sql: str, params: tuple, hydrate: bool = True) -> list[HistoryRecord]:
+        with self._lock:
+            rows = self._conn.execute(sql.format(columns=self.RECORD_COLUMNS), params).fetchall()
+        return self._load(rows, hydrate)
+
+    def _load(self, rows: list, hydrate: bool) -> list[HistoryRecord]:
+        records = []
+        for record, mitre_key, vt_key in rows:
+            record = json.loads(record)
+            if mitre_key:
+                record["mitre_key"] = mitre_key
+            if vt_key:
+                record["virustotal_key"] = vt_key
+            records.append(record)
+        return self.hydrate_many(records) if hydrate else records
+
+    def hydrate(self, record: HistoryRecord) -> HistoryRecord:
+        """Puts the interned payloads back into a record read with hydrate=False."""
+        return self.hydrate_many([record])[0]
+
+    def hydrate_many(self, records: list[HistoryRecord]) -> list[HistoryRecord]:
+        for field, table in PAYLOAD_TABLES.items():
+            key_field = f"{field}_key"
+            keys = {r[key_field] for r in records if r.get(key_field)}
+            payloads = self._payloads(table, keys)
+            for record in records:
+                key = record.pop(key_field, None)
+                if key:
+                    record[field] = payloads.get(key)
+        return records
+
+    def _payloads(self, table: str, keys: set) -> dict:
+        """Parsed payloads for `keys`, through a per-table LRU cache."""
+        with self._lock:
+            cache = self._payload_cache[table]
+            found = {}
+            missing = []
+            for key in keys:
+                if key in cache:
+                    cache.move_to_end(key)
+                    found[key] = cache[key]
+                else:
+                    missing.append(key)
+
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, payload FROM {table} WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, payload in rows:
+                    found[key] = cache[key] = json.loads(payload)
+
+            # The result is built already: evicting cannot lose a key we return
+            while len(cache) > PAYLOAD_CACHE_SIZE:
+                cache.popitem(last=False)
+
+        return found
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def page(self, after: int = 0, limit: int = PAGE_SIZE,
+             hydrate: bool = True) -> tuple[list[HistoryRecord], Optional[int]]:
+        """
+        Up to `limit` records after cursor `after`, oldest first, and
+        the cursor of the next page (None at the end). Keyset
+        pagination: page N costs the same as page 1.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {self.RECORD_COLUMNS} FROM history WHERE id > ? ORDER BY id LIMIT ?",
+                (after, limit)
+            ).fetchall()
+        records = self._load([row[1:] for row in rows], hydrate)
+        cursor = rows[-1][0] if len(rows) == limit else None
+        return records, cursor
+
+    def iter_pages(self, page_size: int = PAGE_SIZE, after: int = 0,
+                   hydrate: bool = True) -> Iterator[list[HistoryRecord]]:
+        while after is not None:
+            records, after = self.page(after, page_size, hydrate)
+            if records:
+                yield records
+
+    def iter_records(self, page_size: int = PAGE_SIZE, hydrate: bool = True) -> Iterator[HistoryRecord]:
+        """Every record, oldest first, one page in memory at a time."""
+        for records in self.iter_pages(page_size, hydrate=hydrate):
+            yield from records
+
+    def find_by_ip(self, source_ip: str, limit: int = 100, hydrate: bool = True) -> list[HistoryRecord]:
+        """Newest first."""
+        return self._records(
+            "SELECT {columns} FROM history WHERE source_ip = ? ORDER BY ingested DESC LIMIT ?",
+            (source_ip, limit),
+            hydrate
+        )
+
+    def find_by_user(self, username: str, limit: int = 100, hydrate: bool = True) -> list[HistoryRecord]:
+        """Newest first."""
+        return self._records(
+            "SELECT {columns} FROM history WHERE username = ? ORDER BY ingested DESC LIMIT ?",
+            (username, limit),
+            hydrate
+        )
+
+    def find_by_technique(self, mitre_id: str, limit: int = 100, hydrate: bool = True) -> list[HistoryRecord]:
+        """Newest first."""
+        return self._records(
+            "SELECT {columns} FROM history WHERE mitre_id = ? ORDER BY ingested DESC LIMIT ?",
+            (mitre_id, limit),
+            hydrate
+        )
+
+    def find_by_risk(self, min_score: float, max_score: float = 10, limit: int = 100,
+                     hydrate: bool = True) -> list[HistoryRecord]:
+        """Highest risk first."""
+        return self._records(
+            "SELECT {columns} FROM history WHERE risk_score BETWEEN ? AND ? "
+            "ORDER BY risk_score DESC LIMIT ?",
+            (min_score, max_score, limit),
+            hydrate
+        )
+
+    def since(self, start: Timestamp, until: Timestamp = None, limit: int = -1,
+              hydrate: bool = True) -> list[HistoryRecord]:
+        """Records ingested in [start, until), oldest first."""
+        until = float("inf") if until is None else to_timestamp(until)
+        return self._records(
+            "SELECT {columns} FROM history WHERE ingested >= ? AND ingested < ? "
+            "ORDER BY ingested LIMIT ?",
+            (to_timestamp(start), until, limit),
+            hydrate
+        )
+
+    def top_ips(self, n: int = 10, since: Timestamp = None) -> list[tuple[str, int]]:
+        """Most frequent source IPs as (ip, count), optionally since a time."""
+        if since is None:
+            sql = ("SELECT source_ip, COUNT(*) AS hits FROM history WHERE source_ip IS NOT NULL "
+                   "GROUP BY source_ip ORDER BY hits DESC LIMIT ?")
+            params = (n,)
+        else:
+            sql = ("SELECT source_ip, COUNT(*) AS hits FROM history "
+                   "WHERE source_ip IS NOT NULL AND ingested >= ? "
+                   "GROUP BY source_ip ORDER BY hits DESC LIMIT ?")
+            params = (to_timestamp(since), n)
+
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # ---------------------------------------------------------
+    # Shutdown
+    # ---------------------------------------------------------
+    def sync(self):
+        with self._lock:
+            if not self.closed:
+                self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._conn.close()
@@ -3,10 +3,29 @@
 # Unified History Writer for SOAx Platform
 # Stores alert, MITRE, VirusTotal, and LLM output
 # in the official schema format defined in SOAx_data_schema.py
+# - Backends (HISTORY_BACKEND):
+#   sqlite: indexed store with a query API (history_db.py)
+#   jsonl:  append-only JSON-lines log: one record per line,
+#           O(1) per save, a crash can only tear the last line
+#   archive: time-bucketed, compressed segments with retention
+#           and compaction (history_archive.py)
+# - fsync policy: always | interval | never
+# - Single writer thread per store: saves are queued and
+#   committed in groups; file locks for multi-process use
+# - One-time migration from the legacy history.json
 # ================================================
 
 import json
 import os
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Iterable, Iterator
+from storage.file_lock import FileLock
+from storage.history_db import HistoryDB
+from storage.history_archive import HistoryArchive
 from framework.SOAx_data_schema import (
     AlertSchema,
     MitreSchema,
@@ -15,29 +34,483 @@ from framework.SOAx_data_schema import (
     HistoryRecord
 )
 
-HISTORY_PATH = "storage/history.json"
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "sqlite")
+HISTORY_BACKENDS = ("sqlite", "jsonl", "archive")
 
+HISTORY_PATH = "storage/history.jsonl"
+HISTORY_DB_PATH = "storage/history.sqlite3"
+HISTORY_ARCHIVE_DIR = "storage/history_archive"
+# Pre-log format (one JSON array), migrated once. The dashboard
+# (src/data/realAlerts.ts) and the L3 scripts still read it:
+# close_history() re-exports it next to HISTORY_PATH
+LEGACY_HISTORY_PATH = "storage/history.json"
+# Rewrite history.json from the store when a process that saved records
+# closes history, so those readers keep seeing new analyses
+HISTORY_EXPORT_JSON = os.getenv("HISTORY_EXPORT_JSON", "1") != "0"
 
-def load_history() -> list:
-    """Loads existing history or returns an empty list."""
-    if os.path.exists(HISTORY_PATH):
-        with open(HISTORY_PATH, "r") as file:
-            return json.load(file)
-    return []
+# always: fsync every record (survives power loss)
+# interval: fsync at most every HISTORY_FSYNC_INTERVAL seconds
+# never: leave it to the OS (survives a process crash only)
+HISTORY_FSYNC = os.getenv("HISTORY_FSYNC", "interval")
+HISTORY_FSYNC_INTERVAL = float(os.getenv("HISTORY_FSYNC_INTERVAL", 1.0))
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Most records committed in one group (one transaction / one write)
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 256))
+# Records waiting for the writer before save_to_history blocks
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", 10000))
+# Attempts per group before it is spilled to <store>.unsaved.jsonl
+HISTORY_WRITE_RETRIES = 5
+
+
+# ------------------------------------------------
+# Log writer
+# ------------------------------------------------
+class HistoryLog:
+    """
+    Keeps the log open for appending. Each group of records is
+    written and flushed at once, so readers see it immediately;
+    durability on disk follows the fsync policy (one fsync per group
+    at most).
+
+    The thread lock and a file lock (for other processes appending to
+    the same log) keep lines whole.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH, fsync: str = HISTORY_FSYNC,
+                 fsync_interval: float = HISTORY_FSYNC_INTERVAL):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown HISTORY_FSYNC {fsync!r} (expected one of {', '.join(FSYNC_POLICIES)})")
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(path)
+        with self._file_lock:
+            migrate_legacy_history(legacy_path_for(path), path)
+            self._file = open(path, "ab")
+            self._repair_tail()
+        self._last_sync = time.monotonic()
+        self.closed = False
+
+    def _repair_tail(self):
+        # A crash mid-append leaves a line without "\n"; end it so the
+        # next record starts on its own line (readers skip the torn one)
+        size = self._file.seek(0, os.SEEK_END)
+        if size:
+            with open(self.path, "rb") as f:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")
+                    self._file.flush()
+
+    def append(self, record: HistoryRecord):
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[HistoryRecord]) -> int:
+        lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in records]
+        data = "".join(lines).encode("utf-8")
+
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("History log is closed")
+            with self._file_lock:
+                self._file.write(data)
+                self._file.flush()
+
+            if self.fsync == "always":
+                os.fsync(self._file.fileno())
+            elif self.fsync == "interval":
+                now = time.monotonic()
+                if now - self._last_sync >= self.fsync_interval:
+                    os.fsync(self._file.fileno())
+                    self._last_sync = now
+        return len(lines)
+
+    def sync(self):
+        with self._lock:
+            if not self.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._file.flush()
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+
+# ------------------------------------------------
+# Single writer (group commit)
+# ------------------------------------------------
+class HistoryWriter:
+    """
+    The only thread that writes to a store. submit() puts the record
+    on a bounded queue; the writer takes everything waiting (up to
+    batch_size) and commits it with one append_many: one SQLite
+    transaction or one log write + fsync, then resolves the group's
+    futures. Callers that wait on them (save_to_history does) are
+    committed together, so under load groups grow and the cost per
+    record falls.
+
+    A group that keeps failing is spilled to <store>.unsaved.jsonl
+    rather than dropped; if that fails too, the group's futures get
+    the error and the thread carries on. flush() waits for everything
+    queued before it; close() drains the queue and stops the thread.
+    """
+
+    def __init__(self, store, batch_size: int = HISTORY_BATCH_SIZE,
+                 queue_size: int = HISTORY_QUEUE_SIZE):
+        self.store = store
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = object()
+        self.closed = False
+
+        self.written = 0
+        self.groups = 0
+        self.spilled = 0
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: HistoryRecord) -> Future:
+        """Future resolved once the record is committed (or spilled)."""
+        if self.closed:
+            raise RuntimeError("History writer is closed")
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def flush(self):
+        if self.closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put(self._stop)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = [item for item in items if isinstance(item, tuple)]
+            if pending:
+                try:
+                    self._commit([record for record, _ in pending])
+                except Exception as e:
+                    # Neither stored nor spilled: the callers raise, nobody hangs
+                    print(f"❌ History write lost {len(pending)} records: {e}")
+                    for _, future in pending:
+                        future.set_exception(e)
+                else:
+                    for _, future in pending:
+                        future.set_result(None)
+
+            # Markers after their group: every record queued before them is written
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is self._stop for item in items):
+                return
+
+    def _commit(self, records: list[HistoryRecord]):
+        for attempt in range(HISTORY_WRITE_RETRIES):
+            try:
+                self.store.append_many(records)
+                self.written += len(records)
+                self.groups += 1
+                return
+            except Exception as e:
+                error = e
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        spill_path = f"{self.store.path}.unsaved.jsonl"
+        try:
+            with open(spill_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as spill_error:
+            raise OSError(f"history write failed ({error}) and spilling to "
+                          f"{spill_path} failed ({spill_error})") from error
+        self.spilled += len(records)
+        print(f"❌ History write failed ({error}); {len(records)} records kept in {spill_path}")
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "groups": self.groups,
+            "records_per_group": self.written / self.groups if self.groups else 0.0,
+            "queued": self._queue.qsize(),
+            "spilled": self.spilled,
+        }
+
+
+# ------------------------------------------------
+# Open stores (one per backend + path)
+# ------------------------------------------------
+_stores = {}
+_writers = {}
+_stores_lock = threading.Lock()
+
+
+def open_history_db(path: str) -> HistoryDB:
+    """
+    Opens the SQLite store; an empty one first imports the JSON-lines
+    log beside it (or the legacy history.json), oldest first.
+    """
+    db = HistoryDB(path, fsync=HISTORY_FSYNC)
+    with FileLock(path):  # another process may be importing too
+        if db.count() == 0:
+            _import_into(db, os.path.splitext(path)[0] + ".jsonl")
+    return db
+
+
+def open_history_archive(path: str) -> HistoryArchive:
+    """
+    Opens the segment archive; an empty one first imports the
+    JSON-lines log (or the legacy history.json) in storage/.
+    """
+    archive = HistoryArchive(path, fsync=HISTORY_FSYNC, fsync_interval=HISTORY_FSYNC_INTERVAL)
+    with FileLock(path):
+        if not archive.segments():
+            _import_into(archive, HISTORY_PATH)
+    return archive
+
+
+def _import_into(store, log_path: str):
+    legacy_path = legacy_path_for(log_path)
+    if os.path.exists(log_path):
+        source, records = log_path, _iter_log(log_path)
+    elif os.path.exists(legacy_path):
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            source, records = legacy_path, json.load(f)
+    else:
+        return
+
+    # Original ingestion times are unknown; the file's mtime is the best bound
+    ingested = os.path.getmtime(source)
+    imported = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= 1000:
+            imported += store.append_many(batch, ingested=ingested)
+            batch = []
+    imported += store.append_many(batch, ingested=ingested)
+    print(f"📜 Imported {imported} history records from {source} into {store.path}")
+
+
+def get_history(backend: str = None, path: str = None):
+    """
+    The open store history is saved to: a HistoryDB (sqlite), a
+    HistoryLog (jsonl) or a HistoryArchive. Opened once per path,
+    closed at exit. Saves
+    should go through get_history_writer(); the store is for reads.
+    """
+    backend = backend or HISTORY_BACKEND
+    if backend not in HISTORY_BACKENDS:
+        raise ValueError(f"Unknown HISTORY_BACKEND {backend!r} (expected one of {', '.join(HISTORY_BACKENDS)})")
+    opener, default_path = {
+        "sqlite": (open_history_db, HISTORY_DB_PATH),
+        "jsonl": (HistoryLog, HISTORY_PATH),
+        "archive": (open_history_archive, HISTORY_ARCHIVE_DIR),
+    }[backend]
+    path = path or default_path
+
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None or store.closed:
+            store = _stores[path] = opener(path)
+        return store
+
+
+def get_history_db() -> HistoryDB:
+    """
+    The queryable store (find_by_ip, since, top_ips, pages, ...).
+    Only the sqlite backend keeps one.
+    """
+    if HISTORY_BACKEND != "sqlite":
+        raise RuntimeError("History queries need HISTORY_BACKEND=sqlite")
+    return get_history()
+
+
+def get_history_writer() -> "HistoryWriter":
+    """The single writer of the current store, started on first use."""
+    store = get_history()
+    with _stores_lock:
+        writer = _writers.get(store.path)
+        if writer is None or writer.closed:
+            writer = _writers[store.path] = HistoryWriter(store)
+        return writer
+
+
+def flush_history():
+    """Blocks until every record saved so far is committed."""
+    with _stores_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+def close_history():
+    """
+    Drains the writers, refreshes history.json if this process saved
+    anything (HISTORY_EXPORT_JSON), then fsyncs and closes every open
+    store (idempotent). Registered at exit: saved records are never
+    dropped on a normal shutdown.
+    """
+    with _stores_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+    if HISTORY_EXPORT_JSON and any(writer.written for writer in writers):
+        try:
+            count = export_history_json()
+            print(f"📜 Exported {count} history records to {legacy_path_for(HISTORY_PATH)}")
+        except Exception as e:
+            print(f"⚠️ history.json export failed: {e}")
+
+    with _stores_lock:
+        stores = list(_stores.values())
+        _stores.clear()
+    for store in stores:
+        store.close()
+
+
+atexit.register(close_history)
+
+
+# ------------------------------------------------
+# Migration & export (legacy history.json)
+# ------------------------------------------------
+def legacy_path_for(path: str) -> str:
+    """history.jsonl → the history.json beside it."""
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def migrate_legacy_history(legacy_path: str, path: str) -> int:
+    """
+    Copies the records of history.json into a new log. Runs only while
+    the log does not exist yet; the log appears in one rename, so an
+    interrupted migration simply runs again. history.json is left as is.
+    Returns the number of records migrated.
+    """
+    if os.path.exists(path) or not os.path.exists(legacy_path):
+        return 0
+
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    def write(f):
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    _write_atomic(path, write)
+    print(f"📜 Migrated {len(records)} history records from {legacy_path} to {path}")
+    return len(records)
+
+
+def export_history_json(target: str = None) -> int:
+    """
+    Writes history as one JSON array (the legacy format) for consumers
+    that read a whole file, such as the dashboard. Returns the count.
+    """
+    target = target or legacy_path_for(HISTORY_PATH)
+    count = 0
+
+    def write(f):
+        nonlocal count
+        f.write("[")
+        for record in load_history():
+            f.write(",\n" if count else "\n")
+            f.write(json.dumps(record, indent=2, ensure_ascii=False))
+            count += 1
+        f.write("\n]")
+
+    _write_atomic(target, write)
+    return count
+
+
+# ------------------------------------------------
+# Read / write
+# ------------------------------------------------
+def load_history() -> Iterator[HistoryRecord]:
+    """
+    Streams history records, oldest first, a page or line at a time.
+    Records still queued for the writer are committed first.
+    """
+    flush_history()
+    if HISTORY_BACKEND == "jsonl":
+        return _iter_log(HISTORY_PATH)
+    return get_history().iter_records()
+
+
+def _iter_log(path: str) -> Iterator[HistoryRecord]:
+    """Reads a JSON-lines log; a torn line (crash mid-append) is skipped."""
+    if not os.path.exists(path):
+        migrate_legacy_history(legacy_path_for(path), path)
+    if not os.path.exists(path):
+        return
+
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
 
 
 def save_to_history(
     alert: AlertSchema,
     mitre: MitreSchema,
     virustotal: VirusTotalSchema,
-    llm_response: LLMResponseSchema
+    llm_response: LLMResponseSchema,
+    provenance: dict = None,
+    wait: bool = True
 ):
-    """Stores a full analysis record into history.json"""
-
-    os.makedirs("storage", exist_ok=True)
-
-    # Load current history
-    history = load_history()
+    """
+    Stores a full analysis record through the history writer.
+    provenance is set when llm_response was reused from a past record.
+    wait: return only once the record is committed (concurrent savers
+    share one commit); False returns at once, see flush_history().
+    """
 
     # Create unified SOAx history record
     entry: HistoryRecord = {
@@ -46,12 +519,18 @@ def save_to_history(
         "virustotal": virustotal,
         "llm_response": llm_response
     }
+    if provenance:
+        entry["provenance"] = provenance
 
-    # Append record
-    history.append(entry)
-
-    # Write back to file
-    with open(HISTORY_PATH, "w") as file:
-        json.dump(history, file, indent=2, ensure_ascii=False)
+    committed = get_history_writer().submit(entry)
+    if wait:
+        committed.result()
 
     return entry
+
+
+# ------------------------------------------------
+# Manual Execution
+# ------------------------------------------------
+if __name__ == "__main__":
+    print(f"Exported {export_history_json()} records to {legacy_path_for(HISTORY_PATH)}")
@@ -0,0 +1,248 @@
+# ================================================
+# storage/reuse_index.py
+# Near-duplicate gate for the SOAx LLM step
+# - Fingerprint = source IP + username + normalized
+#   alert text + MITRE/VT verdicts
+# - Exact fingerprint hit, else word-shingle Jaccard
+#   against past records of the same host, user and verdicts
+# - Reused analyses carry provenance
+# - Metrics: hit rate, LLM calls avoided
+# ================================================
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+
+from storage.history_store import load_history
+from prompt_generator import FALLBACK
+from framework.SOAx_data_schema import (
+    AlertSchema,
+    MitreSchema,
+    VirusTotalSchema,
+    HistoryRecord
+)
+
+ALERT_REUSE_ENABLED = os.getenv("ALERT_REUSE", "1") != "0"
+# Minimum Jaccard similarity of the normalized descriptions
+ALERT_REUSE_THRESHOLD = float(os.getenv("ALERT_REUSE_THRESHOLD", 0.9))
+# Analyses kept in memory, in total and per bucket (newest win)
+ALERT_REUSE_MAX_ENTRIES = int(os.getenv("ALERT_REUSE_MAX_ENTRIES", 50_000))
+ALERT_REUSE_BUCKET_SIZE = int(os.getenv("ALERT_REUSE_BUCKET_SIZE", 500))
+
+IP_PATTERN = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")
+HASH_PATTERN = re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{8,}\b")
+NUMBER_PATTERN = re.compile(r"\b\d+\b")
+WORD_PATTERN = re.compile(r"[a-z<>]+")
+
+
+# ------------------------------------------------
+# Normalization & fingerprint
+# ------------------------------------------------
+def normalize_text(text: str) -> str:
+    """Lowercase; IPs, hashes and numbers become placeholders."""
+    text = (text or "").lower()
+    text = IP_PATTERN.sub("<ip>", text)
+    text = HASH_PATTERN.sub("<hash>", text)
+    text = NUMBER_PATTERN.sub("<n>", text)
+    return " ".join(WORD_PATTERN.findall(text))
+
+
+def shingles(normalized: str) -> frozenset:
+    """Words plus word bigrams, so word order counts a little."""
+    words = normalized.split()
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def vt_verdict(vt: VirusTotalSchema) -> str:
+    vt = vt or {}
+    if (vt.get("malicious") or 0) > 0:
+        return "malicious"
+    if (vt.get("suspicious") or 0) > 0:
+        return "suspicious"
+    return "clean"
+
+
+def verdict_key(mitre: MitreSchema, vt: VirusTotalSchema) -> str:
+    return f"{(mitre or {}).get('id') or 'N/A'}|{vt_verdict(vt)}"
+
+
+def bucket_key(alert: AlertSchema, mitre: MitreSchema, vt: VirusTotalSchema) -> str:
+    """
+    Analyses are only shared within one source IP and username: the
+    stored IR action and recommendation name the original host.
+    """
+    alert = alert or {}
+    source_ip = (alert.get("source_ip") or "").strip()
+    username = (alert.get("username") or "").strip().lower()
+    return f"{source_ip}|{username}|{verdict_key(mitre, vt)}"
+
+
+def fingerprint(alert: AlertSchema, mitre: MitreSchema, vt: VirusTotalSchema) -> str:
+    payload = f"{bucket_key(alert, mitre, vt)}|{normalize_text(alert.get('description'))}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ------------------------------------------------
+# Index
+# ------------------------------------------------
+class AnalysisReuseIndex:
+    """
+    In-memory index of past analyses, bucketed by source IP, username
+    and verdicts (MITRE technique + VT malicious/suspicious/clean).
+    Only analyses of the same host and user with the same verdicts are
+    ever compared: another host's analysis, or a description seen
+    before with a different reputation, still goes to the LLM.
+
+    Per fingerprint it keeps the shingles, the alert (for provenance)
+    and the llm_response, not the MITRE and VT payloads. At most
+    max_entries analyses are kept, max_bucket per bucket: the
+    oldest added go first, which also bounds the similarity scan.
+
+    seed: optional callable returning past records, read on first use.
+
+    Records whose analysis is the parser's fallback are not indexed:
+    a failed generation is never worth repeating.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ALERT_REUSE_THRESHOLD,
+        max_entries: int = ALERT_REUSE_MAX_ENTRIES,
+        max_bucket: int = ALERT_REUSE_BUCKET_SIZE,
+        seed: Callable[[], Iterable[HistoryRecord]] = None
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bucket = max_bucket
+        self._seed = seed
+        self._exact = OrderedDict()     # fp -> (bucket key, alert, llm_response)
+        self._buckets = {}              # bucket key -> OrderedDict(fp -> shingles)
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+
+    def add(self, record: HistoryRecord):
+        with self._lock:
+            self._load()
+            self._add(record)
+
+    def _load(self):
+        # Call under self._lock
+        if self._seed is None:
+            return
+        seed, self._seed = self._seed, None
+        for record in seed():
+            # Reused records repeat an analysis that is already indexed
+            if not record.get("provenance"):
+                self._add(record)
+
+    def _add(self, record: HistoryRecord):
+        response = record.get("llm_response") or {}
+        if not response or response.get("recommendation") == FALLBACK["recommendation"]:
+            return
+
+        alert = record.get("alert") or {}
+        key = bucket_key(alert, record.get("mitre"), record.get("virustotal"))
+        fp = fingerprint(alert, record.get("mitre"), record.get("virustotal"))
+        bucket = self._buckets.setdefault(key, OrderedDict())
+
+        # Newest analysis wins for an identical fingerprint
+        self._exact[fp] = (key, alert, response)
+        self._exact.move_to_end(fp)
+        if fp in bucket:
+            bucket.move_to_end(fp)
+        else:
+            bucket[fp] = shingles(normalize_text(alert.get("description")))
+
+        while len(bucket) > self.max_bucket:
+            old_fp, _ = bucket.popitem(last=False)
+            del self._exact[old_fp]
+        while len(self._exact) > self.max_entries:
+            old_fp, (old_key, _, _) = self._exact.popitem(last=False)
+            old_bucket = self._buckets[old_key]
+            del old_bucket[old_fp]
+            if not old_bucket:
+                del self._buckets[old_key]
+
+    def lookup(self, alert: AlertSchema, mitre: MitreSchema,
+               vt: VirusTotalSchema) -> Optional[tuple[HistoryRecord, dict]]:
+        """
+        Returns (past record, provenance) when a past analysis is close
+        enough to reuse, else None. The record holds only the past
+        alert and its llm_response.
+        """
+        fp = fingerprint(alert, mitre, vt)
+
+        with self._lock:
+            self._load()
+            self.lookups += 1
+
+            if fp in self._exact:
+                self.exact_hits += 1
+                return self._match(fp, fp, 1.0)
+
+            if self.threshold >= 1.0:
+                return None
+
+            features = shingles(normalize_text(alert.get("description")))
+            # Jaccard >= threshold needs sizes within that ratio
+            low = len(features) * self.threshold
+            high = len(features) / self.threshold if self.threshold > 0 else float("inf")
+            best_fp, best_score = None, 0.0
+            for candidate_fp, candidate in self._buckets.get(bucket_key(alert, mitre, vt), {}).items():
+                if not low <= len(candidate) <= high:
+                    continue
+                score = jaccard(features, candidate)
+                if score > best_score:
+                    best_fp, best_score = candidate_fp, score
+
+            if best_fp is None or best_score < self.threshold:
+                return None
+
+            self.similar_hits += 1
+            return self._match(fp, best_fp, best_score)
+
+    def _match(self, fp: str, matched_fp: str, similarity: float) -> tuple[HistoryRecord, dict]:
+        _, alert, response = self._exact[matched_fp]
+        record = {"alert": alert, "llm_response": response}
+        provenance = {
+            "source": "history",
+            "fingerprint": fp,
+            "matched_fingerprint": matched_fp,
+            "similarity": round(similarity, 3),
+            "matched_alert": alert,
+        }
+        return record, provenance
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            return {
+                "indexed": len(self._exact),
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "llm_calls_avoided": hits,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_reuse_index() -> Optional[AnalysisReuseIndex]:
+    """Process-wide index, seeded from history on its first use."""
+    if not ALERT_REUSE_ENABLED:
+        return None
+
+    return AnalysisReuseIndex(seed=load_history)
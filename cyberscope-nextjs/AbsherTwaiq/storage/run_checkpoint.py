@@ -0,0 +1,136 @@
+# ================================================
+# storage/run_checkpoint.py
+# Durable checkpoints for batch runs (analyze.py)
+# - Each alert fingerprinted (content + occurrence)
+# - SQLite side table: done / failed per run
+# - Restart skips done alerts, retries failed ones
+# ================================================
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+from framework.SOAx_data_schema import AlertSchema
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECKPOINT_PATH = os.getenv(
+    "ANALYZE_CHECKPOINT_PATH",
+    os.path.join(BASE_DIR, "storage", "analyze_checkpoint.sqlite3")
+)
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def alert_fingerprints(alerts: list[AlertSchema], seen: dict = None) -> list[str]:
+    """
+    Stable id per alert: hash of its canonical JSON plus how many
+    identical alerts came before it, so repeats in one input file are
+    each analyzed (and checkpointed) once.
+
+    seen: occurrence counts carried across calls when an input arrives
+    in batches (see framework/alert_stream.py).
+    """
+    seen = {} if seen is None else seen
+    fingerprints = []
+    for alert in alerts:
+        content = hashlib.sha256(
+            json.dumps(alert, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        occurrence = seen.get(content, 0)
+        seen[content] = occurrence + 1
+        fingerprints.append(f"{content}:{occurrence}")
+    return fingerprints
+
+
+class RunCheckpoint:
+    """
+    One row per (run, alert fingerprint). A row is written the moment
+    an alert finishes, so a crash loses at most the alerts in flight.
+    The records themselves live in history; this table only tracks
+    which alerts are finished.
+    """
+
+    def __init__(self, run_id: str, path: str = CHECKPOINT_PATH):
+        self.run_id = run_id
+        self.path = path
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS alert_checkpoints (
+                run_id      TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                attempts    INTEGER NOT NULL,
+                error       TEXT,
+                updated     REAL NOT NULL,
+                PRIMARY KEY (run_id, fingerprint)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def completed(self) -> set[str]:
+        """Fingerprints of this run's finished alerts."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fingerprint FROM alert_checkpoints WHERE run_id = ? AND status = ?",
+                (self.run_id, STATUS_DONE)
+            ).fetchall()
+        return {fp for (fp,) in rows}
+
+    def mark_done(self, fingerprint: str):
+        self._upsert(fingerprint, STATUS_DONE, None)
+
+    def mark_failed(self, fingerprint: str, error: str):
+        self._upsert(fingerprint, STATUS_FAILED, error)
+
+    def _upsert(self, fingerprint: str, status: str, error: Optional[str]):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO alert_checkpoints VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT (run_id, fingerprint) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = attempts + 1,
+                    error = excluded.error,
+                    updated = excluded.updated
+                """,
+                (self.run_id, fingerprint, status, error, time.time())
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), SUM(attempts) FROM alert_checkpoints "
+                "WHERE run_id = ? GROUP BY status",
+                (self.run_id,)
+            ).fetchall()
+        counts = {status: count for status, count, _ in rows}
+        return {
+            "done": counts.get(STATUS_DONE, 0),
+            "failed": counts.get(STATUS_FAILED, 0),
+            "attempts": sum(attempts for _, _, attempts in rows),
+        }
+
+    def reset(self):
+        """Forgets this run (start over from alert 1)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM alert_checkpoints WHERE run_id = ?", (self.run_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()